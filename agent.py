@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import threading
+from contextlib import nullcontext
+
+from tools import TOOLS, execute_actions
+from tools.tracing import Tracer, span, use_tracer
+from context_manager import ContextLedger, BackgroundCompactor, ToolOutputPruner, count_tokens
+from prompts import PromptAssembler
+from streaming import stream_step
+from llm_client import StreamInterrupted, backoff_delay, chat_completion
+from json_recovery import count_recovery, recover_step
+from model_router import ModelRouter
+
+# Stream replies and act on a step as soon as its JSON fields are complete
+STREAM_RESPONSES = os.getenv("CODEXLITE_STREAM", "1") != "0"
+MODEL = "gpt-4o"
+
+# Attempts at getting a parseable reply for one step
+STEP_ATTEMPTS = 3
+
+
+class Agent:
+    """One conversation between the model and the tools.
+
+    Holds the ledger, background compactor, pruner, prompt modules and
+    model router of a session. `send` adds a user message and `run` steps
+    the model until it completes, fails or reaches `max_steps`. Status
+    lines go to `log`; with `echo` plan and observe text is also streamed
+    to stdout as it arrives. `on_event` receives every step and tool result
+    as a dict, and `llm_slots` (a semaphore) bounds the model requests made
+    at once by all agents sharing it. Model steps, API calls, tools and
+    compactions are traced as spans under `session_id`.
+    """
+
+    def __init__(self, log=print, echo=True, stream=STREAM_RESPONSES, on_event=None, llm_slots=None,
+                 session_id=None):
+        self.prompt = PromptAssembler()
+        self.ledger = ContextLedger(self.prompt.prompt, model=MODEL)
+        self.compactor = BackgroundCompactor(self.ledger, log=log)
+        self.pruner = ToolOutputPruner()
+        self.router = ModelRouter()
+        self.tracer = Tracer(session_id)
+        self.log = log
+        self.echo = echo
+        self.stream = stream
+        self.on_event = on_event
+        self.llm_slots = llm_slots
+        self.steps = 0
+        self._stop = threading.Event()
+
+    def load_prompt_modules(self, text):
+        """Extend the system prompt with the modules a user message calls for"""
+        added = self.prompt.update(text)
+        if added:
+            self.ledger.set_system(self.prompt.prompt)
+            if self.ledger.journal:
+                self.ledger.journal.note(prompt_modules=self.prompt.modules)
+            self.log(f"🧩 Prompt modules +{', '.join(added)}: {self.prompt.describe(MODEL)}")
+
+    def send(self, text):
+        """Add a user message; a stop requested before it no longer applies"""
+        self._stop.clear()
+        self.load_prompt_modules(text)
+        self.ledger.append({"role": "user", "content": text})
+        self.router.new_request()
+
+    def stop(self):
+        """Make run return before its next step, until the next `send`"""
+        self._stop.set()
+
+    def _emit(self, kind, **data):
+        if self.on_event:
+            self.on_event({"type": kind, **data})
+
+    def _report_retry(self, attempt, delay, error):
+        self.log(f"⏳ API error ({type(error).__name__}), retrying in {delay:.1f}s (retry {attempt})")
+
+    def next_step(self):
+        """Request the next step; returns (reply, parsed, timing), or None when no usable reply came"""
+        for attempt in range(STEP_ATTEMPTS):
+            model, reason = self.router.choose(self.ledger.total_tokens)
+            started = time.perf_counter()
+            with span("step", "llm", model=model, reason=reason, attempt=attempt + 1,
+                      prompt_tokens=self.ledger.total_tokens, ok=False) as attrs:
+                try:
+                    request = dict(
+                        model=model,
+                        response_format={"type": "json_object"},
+                        messages=self.ledger.messages,
+                        temperature=0.3,
+                        max_tokens=2000,
+                        on_retry=self._report_retry
+                    )
+                    timing = None
+                    with self.llm_slots or nullcontext():
+                        if self.stream:
+                            reply, parsed, timing = stream_step(echo=self.echo, **request)
+                        else:
+                            response = chat_completion(**request)
+                            choice = response.choices[0]
+                            reply, parsed = recover_step(choice.message.content or "", choice.finish_reason, request)
+                    decision = self.router.record(model, reason, time.perf_counter() - started,
+                                                  self.ledger.total_tokens, count_tokens(reply, MODEL))
+                    attrs.update(ok=True, step=parsed.get("step"), completion_tokens=decision["completion_tokens"])
+                    if timing:
+                        attrs.update(ttft=timing["ttft"], dispatch=timing["dispatch"], early=timing["early"])
+                    self.log(f"🧭 {model} ({reason}) | {decision['latency']:.2f}s")
+                    self._emit("step", step=parsed, model=model, reason=reason, latency=decision["latency"])
+                    return reply, parsed, timing
+                except json.JSONDecodeError as e:
+                    attrs["error"] = f"unparseable reply: {e}"
+                    self.router.record(model, reason, time.perf_counter() - started, self.ledger.total_tokens, 0, ok=False)
+                    self.router.escalate("unparseable reply")
+                    self.log(f"⚠️ JSON parsing error (attempt {attempt + 1}): {e}")
+                    if attempt == STEP_ATTEMPTS - 1:
+                        self.log(f"❌ Failed to get valid JSON after {STEP_ATTEMPTS} attempts")
+                    else:
+                        count_recovery("rerequested")
+                except StreamInterrupted as e:
+                    # Opening the stream succeeded, so chat_completion did not retry this one
+                    attrs["error"] = str(e)
+                    self.router.record(model, reason, time.perf_counter() - started, self.ledger.total_tokens, 0, ok=False)
+                    if attempt == STEP_ATTEMPTS - 1:
+                        self.log(f"❌ API error after {STEP_ATTEMPTS} attempts: {e}")
+                        return None
+                    delay = backoff_delay(attempt + 1, e.__cause__)
+                    self._report_retry(attempt + 1, delay, e.__cause__)
+                    time.sleep(delay)
+                except Exception as e:
+                    # Transient errors while opening a request were already retried with backoff
+                    attrs["error"] = f"{type(e).__name__}: {e}"
+                    self.log(f"❌ API error: {e}")
+                    return None
+        return None
+
+    def run(self, max_steps=None):
+        """Step the model until it completes the request.
+
+        Returns (outcome, content): ("complete", final message), ("failed",
+        reason), ("step_limit", reason) once `max_steps` model steps were
+        taken by this call, or ("stopped", reason) after `stop`.
+        """
+        with use_tracer(self.tracer):
+            return self._run(max_steps)
+
+    def _run(self, max_steps):
+        taken = 0
+        while True:
+            if self._stop.is_set():
+                return "stopped", f"stopped after {taken} steps"
+            if max_steps is not None and taken >= max_steps:
+                return "step_limit", f"stopped after {taken} steps"
+
+            # Drop file contents that a later read or write has superseded
+            pruned, reclaimed = self.pruner.prune(self.ledger)
+            if pruned:
+                self.log(f"✂️ Pruned {pruned} stale tool outputs, reclaimed {reclaimed} tokens")
+
+            # Swap in finished summaries; blocks only past the hard budget
+            self.compactor.turn_boundary()
+
+            result = self.next_step()
+            if result is None:
+                return "failed", "no valid reply from the model"
+            reply, parsed, timing = result
+            taken += 1
+            self.steps += 1
+
+            self.log(f"\n🤖 Assistant: {reply}")
+            self.ledger.append({"role": "assistant", "content": reply})
+            if timing:
+                self.log(f"⏱️ First token: {timing['ttft']:.2f}s | Dispatch: {timing['dispatch']:.2f}s")
+
+            step = parsed.get("step")
+            self.router.observe_step(step)
+            streamed = bool(timing and timing["streamed"])
+
+            if step == "plan":
+                if not streamed:
+                    self.log(f"🔠 PLAN: {parsed['content']}")
+
+            elif step == "action":
+                # A step carries either one tool/input pair or a batch of actions
+                batch = parsed.get("actions")
+                actions = batch if isinstance(batch, list) else [
+                    {"tool": parsed.get("tool"), "input": parsed.get("input")}
+                ]
+                unknown = [a.get("tool") for a in actions if a.get("tool") not in TOOLS]
+                if unknown:
+                    self.log(f"❌ Unknown tool: {', '.join(map(str, unknown))}")
+                    return "failed", f"unknown tool: {', '.join(map(str, unknown))}"
+
+                for action in actions:
+                    self.log(f"⚙️ ACTION: {action.get('tool')} → {action.get('input')}")
+
+                def on_result(result):
+                    self.log(f"📤 OUTPUT ({result['tool']}): {result['output']}")
+                    self._emit("tool_result", **result)
+
+                results = execute_actions(actions, TOOLS, on_result=on_result)
+
+                self.router.observe_results(results)
+                if isinstance(batch, list):
+                    tool_output = {"step": "tool_output", "results": results}
+                else:
+                    tool_output = {"step": "tool_output", **results[0]}
+                self.ledger.append({"role": "user", "content": json.dumps(tool_output)})
+
+            elif step == "observe":
+                if not streamed:
+                    self.log(f"👁️ OBSERVE: {parsed['content']}")
+
+            elif step == "complete":
+                self.log(f"✅ COMPLETE: {parsed['content']}")
+                return "complete", parsed.get("content")
+
+            else:
+                self.log(f"❓ Unknown step: {step}")
+                return "failed", f"unknown step: {step}"
+
+    def close(self):
+        self.compactor.shutdown()
+        self.tracer.close()
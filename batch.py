@@ -0,0 +1,183 @@
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+from tools import Workspace, use_workspace
+from tools.snapshot_store import SESSION_ID
+from agent import Agent
+import response_cache
+from llm_client import POOL_CONNECTIONS, get_client, stats_summary
+from json_recovery import recovery_summary
+
+load_dotenv()
+
+# Tasks run at once unless --concurrency says otherwise
+DEFAULT_CONCURRENCY = 4
+
+# Model steps one task may take before it is stopped
+DEFAULT_MAX_STEPS = 60
+
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def load_tasks(path):
+    """Read tasks from JSONL lines of {"id", "prompt"} or {"request_id", "title", "body"}, each with an optional workspace"""
+    tasks = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{number}: {e}") from None
+            prompt = entry.get("prompt") or entry.get("task")
+            if not prompt:
+                prompt = "\n\n".join(part for part in (entry.get("title"), entry.get("body")) if part)
+            if not prompt:
+                raise ValueError(f"{path}:{number}: task has no prompt")
+            task_id = str(entry.get("id") or entry.get("request_id") or f"task-{number}")
+            tasks.append({"id": task_id, "prompt": prompt, "workspace": entry.get("workspace")})
+    return tasks
+
+
+class BatchRunner:
+    """Runs queued tasks as independent agent sessions, a bounded number at a time.
+
+    Every task gets its own Agent and its own Workspace directory, so the
+    tasks share the process, the API connection pool and the tool threads
+    but not their files, shells, undo history or servers. Each task logs
+    to <workspaces>/<id>.log; its result line is written as soon as it
+    finishes.
+    """
+
+    def __init__(self, workspaces_dir, output_path, concurrency=DEFAULT_CONCURRENCY,
+                 max_steps=DEFAULT_MAX_STEPS):
+        self.workspaces_dir = os.path.abspath(workspaces_dir)
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.max_steps = max_steps
+        self.active = {}
+        self._lock = threading.Lock()
+
+    def run_task(self, task):
+        """Run one task to completion and return its result record"""
+        name = _UNSAFE_NAME.sub("_", task["id"])
+        root = task.get("workspace") or os.path.join(self.workspaces_dir, name)
+        os.makedirs(root, exist_ok=True)
+        log_path = os.path.join(self.workspaces_dir, f"{name}.log")
+        workspace = Workspace(root, name=name)
+        with self._lock:
+            self.active[task["id"]] = workspace
+
+        started = time.time()
+        clock = time.perf_counter()
+        outcome, content = "failed", None
+        with open(log_path, "w", encoding="utf-8") as log_file:
+            def log(message):
+                log_file.write(f"{message}\n")
+                log_file.flush()
+
+            agent = Agent(log=log, echo=False, session_id=f"{SESSION_ID}-{name}")
+            try:
+                with use_workspace(workspace):
+                    agent.send(task["prompt"])
+                    outcome, content = agent.run(max_steps=self.max_steps)
+            except Exception as e:
+                outcome, content = "error", f"{type(e).__name__}: {e}"
+                log(f"❌ Unexpected Error: {content}")
+            finally:
+                agent.close()
+                workspace.close()
+                with self._lock:
+                    self.active.pop(task["id"], None)
+
+        decisions = agent.router.decisions
+        return {
+            "id": task["id"],
+            "outcome": outcome,
+            "result": content,
+            "workspace": os.path.abspath(root),
+            "log": log_path,
+            "trace": agent.tracer.path,
+            "started": started,
+            "duration": round(time.perf_counter() - clock, 3),
+            "steps": agent.steps,
+            "model_time": round(sum(d["latency"] for d in decisions), 3),
+            "prompt_tokens": sum(d["prompt_tokens"] for d in decisions),
+            "completion_tokens": sum(d["completion_tokens"] for d in decisions),
+            "cost": round(agent.router.cost, 6),
+        }
+
+    def run(self, tasks):
+        """Run every task and write one result line per task; returns the results"""
+        os.makedirs(self.workspaces_dir, exist_ok=True)
+        get_client()    # create the shared pool before the workers race for it
+        results = []
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="task")
+        try:
+            with open(self.output_path, "w", encoding="utf-8") as out:
+                futures = {pool.submit(self.run_task, task): task for task in tasks}
+                for future in as_completed(futures):
+                    result = future.result()
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+                    results.append(result)
+                    print(f"{'✅' if result['outcome'] == 'complete' else '❌'} {result['id']}: {result['outcome']} "
+                          f"in {result['duration']:.1f}s, {result['steps']} steps "
+                          f"({len(results)}/{len(tasks)} done)")
+        except KeyboardInterrupt:
+            print("\n🛑 Interrupted. Cancelling queued tasks and stopping servers...")
+            pool.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                workspaces = list(self.active.values())
+            for workspace in workspaces:
+                workspace.close()
+            raise
+        pool.shutdown()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run codexLite over a JSONL queue of tasks without prompts")
+    parser.add_argument("tasks", help="JSONL file with one task per line")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="where result lines are written")
+    parser.add_argument("-w", "--workspaces", default="workspaces",
+                        help="directory holding one workspace and log per task")
+    parser.add_argument("-j", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="tasks run at the same time")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS, help="model steps allowed per task")
+    parser.add_argument("--cache", choices=response_cache.MODES, default=response_cache.CACHE_MODE,
+                        help="response cache mode (default: $CODEXLITE_CACHE or off)")
+    args = parser.parse_args()
+    response_cache.set_mode(args.cache)
+
+    try:
+        tasks = load_tasks(args.tasks)
+    except (OSError, ValueError) as e:
+        print(f"❌ Cannot read tasks: {e}")
+        return
+    concurrency = max(1, args.concurrency)
+    if concurrency > POOL_CONNECTIONS:
+        print(f"⚠️ Concurrency {concurrency} is above the {POOL_CONNECTIONS} pooled API connections; "
+              f"requests will queue for a connection")
+
+    print(f"🚀 Running {len(tasks)} tasks, {concurrency} at a time (workspaces in {args.workspaces})")
+    started = time.perf_counter()
+    try:
+        results = BatchRunner(args.workspaces, args.output, concurrency, args.max_steps).run(tasks)
+    except KeyboardInterrupt:
+        return
+    completed = sum(1 for r in results if r["outcome"] == "complete")
+    print(f"🎉 {completed}/{len(results)} tasks complete in {time.perf_counter() - started:.1f}s "
+          f"→ {args.output}")
+    print(stats_summary())
+    print(recovery_summary())
+
+if __name__ == "__main__":
+    main()
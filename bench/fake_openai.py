@@ -0,0 +1,86 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+SUMMARY_REPLY = "Summary: the assistant planned the work, edited files in the workspace and ran commands."
+
+
+class _Stream:
+    """Iterator of streamed chunks with the close() the OpenAI stream has"""
+
+    def __init__(self, chunks, ttft, chunk_delay):
+        self._chunks = chunks
+        self._ttft = ttft
+        self._chunk_delay = chunk_delay
+        self.closed = False
+
+    def __iter__(self):
+        time.sleep(self._ttft)
+        for chunk in self._chunks:
+            if self.closed:
+                return
+            yield chunk
+            if self._chunk_delay:
+                time.sleep(self._chunk_delay)
+
+    def close(self):
+        self.closed = True
+
+
+def _chunk(text, finish_reason=None):
+    delta = SimpleNamespace(content=text)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+def _completion(text, prompt_bytes):
+    message = SimpleNamespace(content=text)
+    usage = SimpleNamespace(prompt_tokens=prompt_bytes // 4, completion_tokens=len(text) // 4)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=usage)
+
+
+class ScriptedClient:
+    """Stand-in for openai.OpenAI that replays a scripted transcript.
+
+    `script(messages)` returns the step dict to reply with; by default it is
+    picked by the number of assistant messages so far, so many sessions can
+    share one client. Requests without a JSON response format are answered
+    with a fixed summary. Replies arrive after `ttft` seconds and, when
+    streamed, in `chunk_chars` pieces `chunk_delay` seconds apart. Every
+    request's size is kept for prompt-bytes-per-step.
+    """
+
+    def __init__(self, script, ttft=0.0, chunk_delay=0.0, chunk_chars=16):
+        self.script = script if callable(script) else _by_turn(script)
+        self.ttft = ttft
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+        self.prompt_bytes = []
+        self.summaries = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, stream=False, response_format=None, **request):
+        prompt_bytes = len(json.dumps(messages))
+        if response_format is None:
+            with self._lock:
+                self.summaries += 1
+            time.sleep(self.ttft)
+            return _completion(SUMMARY_REPLY, prompt_bytes)
+
+        with self._lock:
+            self.prompt_bytes.append(prompt_bytes)
+        reply = json.dumps(self.script(messages))
+        if not stream:
+            time.sleep(self.ttft)
+            return _completion(reply, prompt_bytes)
+        size = self.chunk_chars
+        chunks = [_chunk(reply[i:i + size]) for i in range(0, len(reply), size)]
+        chunks.append(_chunk(None, "stop"))
+        return _Stream(chunks, self.ttft, self.chunk_delay)
+
+
+def _by_turn(steps):
+    def script(messages):
+        turn = sum(1 for m in messages if m["role"] == "assistant")
+        return steps[min(turn, len(steps) - 1)]
+    return script
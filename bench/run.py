@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import atexit
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+
+# Keep snapshots, indexes and traces of the benchmark out of the user's cache
+BENCH_HOME = tempfile.mkdtemp(prefix="codexlite-bench-")
+os.environ["CODEXLITE_HOME"] = BENCH_HOME
+atexit.register(shutil.rmtree, BENCH_HOME, ignore_errors=True)
+os.environ.setdefault("CODEXLITE_TRACE", "0")
+os.environ.setdefault("CODEXLITE_ROUTING", "large")
+os.environ["CODEXLITE_CACHE"] = "off"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import llm_client
+import response_cache
+from agent import Agent
+from tools import TOOLS, Workspace, use_workspace
+from bench import workspaces
+from bench.fake_openai import ScriptedClient
+
+BASELINES_DIR = os.path.join(REPO_ROOT, "bench", "baselines")
+
+# A metric is flagged when it is this much worse than the baseline
+REGRESSION_THRESHOLD = 0.20
+
+# Latency changes smaller than this are timer noise, whatever their ratio
+NOISE_FLOOR_MS = 1.0
+
+# Metrics where a larger value is better; every other metric is a cost
+HIGHER_IS_BETTER = ("steps_per_sec",)
+
+# Tool outputs that mean a benchmark case is broken rather than slow
+FAILURE_PREFIXES = ("Error", "Invalid input", "Edit rejected", "Patch rejected")
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+def _summary(durations):
+    ordered = sorted(durations)
+    return {
+        "n": len(ordered),
+        "p50_ms": _ms(ordered[len(ordered) // 2]),
+        "p95_ms": _ms(ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)]),
+        "mean_ms": _ms(statistics.fmean(ordered)),
+    }
+
+def _peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def _timed(fn, repeat):
+    durations = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        output = fn(i)
+        durations.append(time.perf_counter() - started)
+        if isinstance(output, str) and output.startswith(FAILURE_PREFIXES):
+            raise RuntimeError(output)
+    return durations
+
+
+def agent_script(steps):
+    """plan, `steps` actions cycling through the common tools, then complete"""
+    actions = [
+        {"tool": "read_file", "input": "src/pkg0/mod0/file_1.py"},
+        {"tool": "list_files", "input": "src/pkg0"},
+        {"tool": "search_code", "input": "find_the_needle"},
+        {"tool": "write_file", "input": {"path": "notes/plan.md", "content": "# Plan\n" + "- step\n" * 50}},
+        {"tool": "edit_file", "input": {"path": "notes/plan.md", "search": "# Plan", "replace": "# Plan (edited)"}},
+        {"tool": "run_command", "input": "ls src | wc -l"},
+        {"actions": [
+            {"tool": "read_file", "input": "src/pkg0/mod1/file_2.py"},
+            {"tool": "find_files", "input": "src/**/file_3.py"},
+            {"tool": "get_current_directory", "input": None},
+        ]},
+    ]
+    script = [{"step": "plan", "content": "Read the code, write notes and check the tree."}]
+    for n in range(steps):
+        action = actions[n % len(actions)]
+        script.append({"step": "action", **action})
+        if n % 3 == 2:
+            script.append({"step": "observe", "content": "The output looks as expected."})
+    script.append({"step": "complete", "content": "Done."})
+    return script
+
+def _scripted_session(tree, script, name):
+    """Run one agent session in `tree` against the installed client; returns its step count"""
+    agent = Agent(log=lambda message: None, echo=False)
+    workspace = Workspace(tree, name=name)
+    try:
+        with use_workspace(workspace):
+            agent.send("Review the project and take notes.")
+            outcome, _ = agent.run(max_steps=len(script) + 1)
+    finally:
+        agent.close()
+        workspace.close()
+    if outcome != "complete":
+        raise RuntimeError(f"scripted session ended with {outcome}")
+    return agent.steps
+
+def bench_agent_loop(root, args):
+    """Steps/sec and per-step overhead of the agent loop against a scripted model"""
+    tree = os.path.join(root, "agent")
+    workspaces.large_tree(tree, dirs=8, files_per_dir=20)
+    script = agent_script(args.steps)
+    client = ScriptedClient(script, ttft=args.latency, chunk_delay=args.chunk_delay)
+    llm_client.set_client(client)
+
+    def run_session(number):
+        return _scripted_session(tree, script, f"agent{number}")
+
+    run_session(-1)     # warm imports, indexes and the shell
+    client.prompt_bytes.clear()
+    started = time.perf_counter()
+    steps = sum(run_session(n) for n in range(args.sessions))
+    elapsed = time.perf_counter() - started
+    prompt_bytes = list(client.prompt_bytes)
+
+    tracemalloc.start()
+    run_session(args.sessions)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    waiting = steps * (args.latency + args.chunk_delay * len(json.dumps(script[1])) / client.chunk_chars)
+    return {
+        "agent.steps": steps,
+        "agent.steps_per_sec": round(steps / elapsed, 2),
+        "agent.step_overhead_ms": _ms(max(elapsed - waiting, 0) / steps),
+        "agent.prompt_bytes_per_step": round(statistics.fmean(prompt_bytes)),
+        "agent.prompt_bytes_last_step": max(prompt_bytes),
+        "agent.python_peak_mb": round(python_peak / 1024 / 1024, 1),
+    }
+
+
+def bench_tools(root, args):
+    """Latency of every tool against a large tree, a huge file, a big log and a chatty server"""
+    tree = os.path.join(root, "tools")
+    files = workspaces.large_tree(tree, dirs=args.tree_dirs, files_per_dir=args.tree_files)
+    lines = workspaces.huge_file(os.path.join(tree, "huge.txt"), args.huge_mb)
+    workspaces.huge_file(os.path.join(tree, "big.log"), max(args.huge_mb // 4, 1))
+    server_cmd, port = workspaces.chatty_server(tree)
+    repeat = args.repeat
+    content = "TITLE = 'bench'\n" + "x = 1\n" * 2000
+    patch = "--- a/out/patched.py\n+++ b/out/patched.py\n@@ -1,3 +1,3 @@\n TITLE = 'bench'\n-x = 1\n+x = 2\n x = 1\n"
+    unpatch = patch.replace("-x = 1\n+x = 2", "-x = 2\n+x = 1")
+
+    cases = [
+        ("get_current_directory", lambda i: TOOLS["get_current_directory"](), repeat),
+        ("create_folder", lambda i: TOOLS["create_folder"](f"dirs/d{i}"), repeat),
+        ("write_file", lambda i: TOOLS["write_file"]({"path": f"out/f{i}.py", "content": content}), repeat),
+        ("read_file[small]", lambda i: TOOLS["read_file"]("src/pkg0/mod0/file_1.py"), repeat),
+        ("read_file[huge head]", lambda i: TOOLS["read_file"]("huge.txt"), repeat),
+        ("read_file[huge range]", lambda i: TOOLS["read_file"](
+            {"path": "huge.txt", "start_line": (i * 7919) % lines + 1, "end_line": (i * 7919) % lines + 100}), repeat),
+        ("edit_file", lambda i: TOOLS["edit_file"](
+            {"path": f"out/f{i}.py", "search": "TITLE = 'bench'", "replace": "TITLE = 'edited'"}), repeat),
+        ("write_file[patch target]", lambda i: TOOLS["write_file"]({"path": "out/patched.py", "content": content}), 1),
+        ("apply_patch", lambda i: TOOLS["apply_patch"](unpatch if i % 2 else patch), repeat),
+        ("undo", lambda i: TOOLS["undo"]({"steps": 1}), repeat),
+        ("restore", lambda i: TOOLS["restore"](f"out/f{i}.py"), repeat),
+        ("list_files[cold]", lambda i: TOOLS["list_files"]("."), 1),
+        ("list_files", lambda i: TOOLS["list_files"]({"path": "src/pkg0", "limit": 50}), repeat),
+        ("find_files", lambda i: TOOLS["find_files"]("src/**/file_7.py"), repeat),
+        ("search_code[cold]", lambda i: TOOLS["search_code"]("find_the_needle"), 1),
+        ("search_code", lambda i: TOOLS["search_code"]("find_the_needle"), repeat),
+        ("search_code[regex]", lambda i: TOOLS["search_code"]({"query": r"def helper_\d+5\(", "regex": True}), repeat),
+        ("run_command", lambda i: TOOLS["run_command"]("echo ready"), repeat),
+        ("run_command[big output]", lambda i: TOOLS["run_command"]("seq 1 200000"), max(repeat // 5, 1)),
+        ("read_log", lambda i: TOOLS["read_log"]({"path": "big.log", "start": 50000 + i, "lines": 200}), repeat),
+        ("run_server[chatty]", lambda i: TOOLS["run_server"]({"command": server_cmd, "port": port}), 1),
+        ("server_logs", lambda i: TOOLS["server_logs"]({"lines": 50}), repeat),
+        ("status", lambda i: TOOLS["status"](), repeat),
+        ("check_port", lambda i: TOOLS["check_port"](port), repeat),
+        ("stop_servers", lambda i: TOOLS["stop_servers"](), 1),
+    ]
+    missing = set(TOOLS) - {name.split("[")[0] for name, _, _ in cases}
+    if missing:
+        raise RuntimeError(f"no benchmark case for tools: {', '.join(sorted(missing))}")
+
+    metrics = {"tools.tree_files": files, "tools.huge_file_mb": args.huge_mb}
+    workspace = Workspace(tree, name="tools")
+    try:
+        with use_workspace(workspace):
+            for name, fn, count in cases:
+                summary = _summary(_timed(fn, count))
+                if count == 1:
+                    metrics[f"tool.{name}.ms"] = summary["p50_ms"]
+                else:
+                    metrics[f"tool.{name}.p50_ms"] = summary["p50_ms"]
+                    metrics[f"tool.{name}.p95_ms"] = summary["p95_ms"]
+                if args.verbose:
+                    print(f"  {name:<28} n={summary['n']:<4} p50 {summary['p50_ms']:>9.3f}ms "
+                          f"p95 {summary['p95_ms']:>9.3f}ms")
+    finally:
+        workspace.close()
+    return metrics
+
+
+def bench_response_cache(root, args):
+    """Steps/sec of a session recorded into the response cache and then replayed from it"""
+    tree = os.path.join(root, "cache")
+    script = agent_script(args.steps)
+    llm_client.set_client(ScriptedClient(script, ttft=args.latency, chunk_delay=args.chunk_delay))
+    metrics = {}
+    try:
+        for mode in ("record", "replay"):
+            # Replay needs the tool outputs, and so the requests, of the recorded run
+            shutil.rmtree(tree, ignore_errors=True)
+            workspaces.large_tree(tree, dirs=2, files_per_dir=10)
+            response_cache.set_mode(mode)
+            started = time.perf_counter()
+            steps = _scripted_session(tree, script, "cache")
+            metrics[f"cache.{mode}_steps_per_sec"] = round(steps / (time.perf_counter() - started), 2)
+        metrics["cache.store_kb"] = round(response_cache.get_cache().info()["bytes"] / 1024, 1)
+    finally:
+        response_cache.set_mode("off")
+    return metrics
+
+
+BENCHMARKS = {
+    "agent": bench_agent_loop,
+    "tools": bench_tools,
+    "cache": bench_response_cache,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print metric changes against a baseline; returns the regressed metric names"""
+    regressions = []
+    print(f"\n{'metric':<44} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in current["metrics"].items():
+        old = baseline["metrics"].get(name)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+            continue
+        change = (value - old) / old
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ""
+        if name.endswith("ms") and abs(value - old) < NOISE_FLOOR_MS:
+            worse = 0
+        if worse > threshold:
+            flag = "  ⚠️ regression"
+            regressions.append(name)
+        print(f"{name:<44} {old:>12} {value:>12} {change:>+7.0%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline codexLite benchmarks against a scripted model")
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK",
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--sessions", type=int, default=5, help="scripted agent sessions")
+    parser.add_argument("--steps", type=int, default=30, help="action steps per scripted session")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake time to first token in seconds")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="fake delay between streamed chunks")
+    parser.add_argument("--tree-dirs", type=int, default=40, help="directories in the large tree")
+    parser.add_argument("--tree-files", type=int, default=50, help="files per directory in the large tree")
+    parser.add_argument("--huge-mb", type=int, default=50, help="size of the huge file")
+    parser.add_argument("--repeat", type=int, default=20, help="calls per tool case")
+    parser.add_argument("--save", metavar="NAME", nargs="?", const="", help="save results as a baseline "
+                        "(default name: the current commit)")
+    parser.add_argument("--compare", metavar="NAME", help="compare with a saved baseline")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 when a metric regressed")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print each tool case as it finishes")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    root = tempfile.mkdtemp(prefix="codexlite-bench-ws-")
+    results = {
+        "revision": git_revision(),
+        "time": time.time(),
+        "python": sys.version.split()[0],
+        "settings": {k: v for k, v in vars(args).items() if k not in ("save", "compare", "check", "verbose")},
+        "metrics": {},
+    }
+    try:
+        for name in args.benchmarks or BENCHMARKS:
+            print(f"🏁 {name}: {BENCHMARKS[name].__doc__}")
+            started = time.perf_counter()
+            results["metrics"].update(BENCHMARKS[name](root, args))
+            print(f"   done in {time.perf_counter() - started:.1f}s")
+        results["metrics"]["memory.peak_rss_mb"] = _peak_rss_mb()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    width = max(len(name) for name in results["metrics"])
+    for name, value in results["metrics"].items():
+        print(f"{name:<{width}}  {value}")
+
+    if args.save is not None:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f"{args.save or results['revision']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline saved to {os.path.relpath(path, REPO_ROOT)}")
+
+    if args.compare:
+        path = args.compare if os.path.exists(args.compare) else os.path.join(BASELINES_DIR, f"{args.compare}.json")
+        with open(path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {baseline['revision']} ({os.path.relpath(path, REPO_ROOT)})")
+        if baseline.get("settings") != results["settings"]:
+            print("⚠️ Baseline was recorded with different settings; changes may not be comparable")
+        regressions = compare(results, baseline)
+        print(f"{len(regressions)} regressions over {REGRESSION_THRESHOLD:.0%}")
+        if regressions and args.check:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import random
+import socket
+
+# Text of the generated source files; every fifth one defines the symbol searched for
+_MODULE = '''import os
+
+
+def helper_{n}(value):
+    """Return value scaled by {n}"""
+    return value * {n}
+
+
+class Widget{n}:
+    def render(self):
+        return "widget {n}"
+'''
+
+_NEEDLE = '''
+
+def find_the_needle():
+    return "needle"
+'''
+
+# A server that answers on its port and logs a line every millisecond
+CHATTY_SERVER = r'''
+import http.server, sys, threading, time
+port = int(sys.argv[1])
+server = http.server.ThreadingHTTPServer(("127.0.0.1", port), http.server.SimpleHTTPRequestHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+print(f"listening on http://127.0.0.1:{port}", flush=True)
+n = 0
+while True:
+    n += 1
+    print(f"[{time.time():.3f}] request {n}: GET /api/items 200 in 3ms", flush=True)
+    time.sleep(0.001)
+'''
+
+
+def large_tree(root, dirs=40, files_per_dir=50, seed=0):
+    """Write a source tree of dirs x files_per_dir modules, plus an ignored node_modules; returns the file count"""
+    rng = random.Random(seed)
+    count = 0
+    for d in range(dirs):
+        directory = os.path.join(root, "src", f"pkg{d // 8}", f"mod{d}")
+        os.makedirs(directory, exist_ok=True)
+        for f in range(files_per_dir):
+            n = d * files_per_dir + f
+            text = _MODULE.format(n=n) + (_NEEDLE if n % 5 == 0 else "")
+            text += "\n".join(f"# filler {rng.random():.12f}" for _ in range(rng.randint(5, 40))) + "\n"
+            with open(os.path.join(directory, f"file_{f}.py"), "w", encoding="utf-8") as out:
+                out.write(text)
+            count += 1
+    ignored = os.path.join(root, "node_modules", "dep")
+    os.makedirs(ignored, exist_ok=True)
+    for f in range(200):
+        with open(os.path.join(ignored, f"index_{f}.js"), "w", encoding="utf-8") as out:
+            out.write("module.exports = function needle() {};\n" * 20)
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as out:
+        out.write("node_modules/\n*.log\n")
+    return count
+
+def huge_file(path, megabytes=50):
+    """Write a text file of about `megabytes` MB of numbered lines; returns its line count"""
+    line = "line {:>9}: the quick brown fox jumps over the lazy dog, again and again\n"
+    lines = megabytes * 1024 * 1024 // len(line.format(0))
+    with open(path, "w", encoding="utf-8") as out:
+        for start in range(0, lines, 10000):
+            out.write("".join(line.format(n) for n in range(start, min(start + 10000, lines))))
+    return lines
+
+def chatty_server(root):
+    """Write the chatty server script; returns (command, port)"""
+    path = os.path.join(root, "chatty_server.py")
+    with open(path, "w", encoding="utf-8") as out:
+        out.write(CHATTY_SERVER)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"python3 -u {path} {port}", port
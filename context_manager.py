@@ -1,45 +1,454 @@
-from openai import OpenAI
+import os
+import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
 
-from dotenv import load_dotenv
-load_dotenv()
-client = OpenAI()
+from llm_client import chat_completion
+from tools.tracing import span
+from tools.workspace import resolve
 
-def should_summarize_context(messages):
-    """Check if context should be summarized"""
-    total_tokens = sum(len(msg["content"]) for msg in messages)
-    return total_tokens > 15000
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
-def summarize_context(messages):
-    """Summarize conversation context"""
+# Conversation token budget per model, excluding the system prompt
+MODEL_CONTEXT_BUDGETS = {
+    "gpt-4o": 12000,
+    "gpt-4o-mini": 12000,
+}
+DEFAULT_CONTEXT_BUDGET = 12000
+
+# Fixed per-message framing cost of the chat format
+TOKENS_PER_MESSAGE = 4
+
+# Fraction of the budget at which background compaction starts
+SOFT_WATERMARK = 0.75
+
+# Most recent messages that are always kept verbatim
+RECENT_MESSAGES = 10
+
+# Summary segments per level before the oldest are merged one level up
+SUMMARY_FANOUT = 4
+
+_encoders = {}
+
+def _encoder(model):
+    """Return a cached tokenizer for the model, or None to fall back to estimates"""
+    if model not in _encoders:
+        encoder = None
+        if tiktoken is not None:
+            try:
+                encoder = tiktoken.encoding_for_model(model)
+            except Exception:
+                try:
+                    encoder = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    encoder = None
+        _encoders[model] = encoder
+    return _encoders[model]
+
+def count_tokens(text, model="gpt-4o"):
+    """Count tokens in text"""
+    encoder = _encoder(model)
+    if encoder is None:
+        # Roughly four characters per token for English text and code
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+def count_message_tokens(message, model="gpt-4o"):
+    """Count tokens a single chat message adds to a request"""
+    return TOKENS_PER_MESSAGE + count_tokens(message.get("content") or "", model)
+
+def context_budget(model):
+    """Token budget for the conversation, overridable with CODEXLITE_CONTEXT_BUDGET"""
+    override = os.getenv("CODEXLITE_CONTEXT_BUDGET")
+    if override:
+        return int(override)
+    return MODEL_CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+
+class ContextLedger:
+    """Message history with a running token count.
+
+    Each message is tokenized once when it enters the history. The system
+    prompt is tracked separately so that only the conversation is measured
+    against the budget.
+    """
+
+    def __init__(self, system_prompt, model="gpt-4o", budget=None):
+        self.model = model
+        self.budget = budget or context_budget(model)
+        self.messages = []
+        self._counts = []
+        self.system_tokens = 0
+        self.conversation_tokens = 0
+        self.appended = 0
+        self.journal = None
+        self.set_system(system_prompt)
+
+    def set_system(self, content):
+        """Install or replace the system prompt"""
+        message = {"role": "system", "content": content}
+        tokens = count_message_tokens(message, self.model)
+        if self.messages:
+            self.messages[0] = message
+            self._counts[0] = tokens
+        else:
+            self.messages.append(message)
+            self._counts.append(tokens)
+        self.system_tokens = tokens
+        if self.journal:
+            self.journal.on_system(message)
+
+    def append(self, message):
+        """Append a message and add its tokens to the running total"""
+        tokens = count_message_tokens(message, self.model)
+        self.messages.append(message)
+        self._counts.append(tokens)
+        self.conversation_tokens += tokens
+        self.appended += 1
+        if self.journal:
+            self.journal.on_append(message)
+
+    def update(self, index, message):
+        """Rewrite a single conversation message in place"""
+        tokens = count_message_tokens(message, self.model)
+        self.conversation_tokens += tokens - self._counts[index]
+        self.messages[index] = message
+        self._counts[index] = tokens
+        if self.journal:
+            self.journal.on_update(index, message)
+
+    def replace(self, messages):
+        """Swap in a rewritten history, reusing counts for messages that were kept"""
+        known = {id(msg): count for msg, count in zip(self.messages, self._counts)}
+        counts = [known.get(id(msg)) for msg in messages]
+        counts = [count_message_tokens(msg, self.model) if count is None else count
+                  for msg, count in zip(messages, counts)]
+        # Mutate in place so callers holding `ledger.messages` stay current
+        self.messages[:] = messages
+        self._counts = counts
+        self.system_tokens = counts[0]
+        self.conversation_tokens = sum(counts[1:])
+        if self.journal:
+            self.journal.on_replace()
+
+    def token_count(self, index):
+        """Tokens counted for the message at index"""
+        return self._counts[index]
+
+    @property
+    def total_tokens(self):
+        return self.system_tokens + self.conversation_tokens
+
+    def over_budget(self):
+        return self.conversation_tokens > self.budget
+
+    def __len__(self):
+        return len(self.messages)
+
+
+def _file_refs(message):
+    """Paths whose content a message carries.
+
+    Returns the decoded message and a list of (path, resolved, window,
+    container, key) where container[key] holds the content of a write_file
+    payload or a read_file result. `resolved` is the absolute path the
+    executor recorded in a tool result, or None. `window` is None for a
+    whole file, or identifies the line or byte range of a partial read.
+    """
+    content = message.get("content") or ""
+    if not content.startswith("{") or ("write_file" not in content and "read_file" not in content):
+        return None, []
     try:
-        system_msg = messages[0]
-        recent_messages = messages[-10:]
-        
-        middle_messages = messages[1:-10] if len(messages) > 11 else []
-        
-        if middle_messages:
-            summary_prompt = """Summarize the following conversation between a user and a coding assistant. 
-            Focus on: 1) What project was built, 2) Key features implemented, 3) Current state of the project.
-            Keep it concise but informative."""
-            
-            summary_content = "\n".join([msg["content"] for msg in middle_messages])
-            
-            summary_response = client.chat.completions.create(
-                model="gpt-4o-mini",  # Use cheaper model for summarization
-                messages=[
-                    {"role": "system", "content": summary_prompt},
-                    {"role": "user", "content": summary_content}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
-            
-            summary = summary_response.choices[0].message.content
-            summary_msg = {"role": "system", "content": f"CONTEXT SUMMARY: {summary}"}
-            
-            return [system_msg, summary_msg] + recent_messages
-        
-        return messages
-    except Exception as e:
-        print(f"Error summarizing context: {e}")
-        return messages 
\ No newline at end of file
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return None, []
+    if not isinstance(data, dict):
+        return None, []
+
+    refs = []
+    is_output = data.get("step") == "tool_output"
+    entries = data.get("actions") or data.get("results") or [data]
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        tool_input = entry.get("input")
+        if entry.get("tool") == "write_file" and isinstance(tool_input, dict):
+            path = tool_input.get("path")
+            if isinstance(path, str) and isinstance(tool_input.get("content"), str):
+                refs.append((path, entry.get("path") if is_output else None, None, tool_input, "content"))
+        if is_output and entry.get("tool") == "read_file":
+            output = entry.get("output")
+            if not isinstance(output, str) or not output.startswith("File content"):
+                continue
+            path, window = tool_input, None
+            if isinstance(tool_input, dict):
+                path = tool_input.get("path")
+                window = tuple(tool_input.get(k) for k in ("start_line", "end_line", "offset", "max_bytes"))
+                if not any(v is not None for v in window[:3]):
+                    window = None
+            if isinstance(path, str):
+                refs.append((path, entry.get("path"), window, entry, "output"))
+    return data, refs
+
+
+class ToolOutputPruner:
+    """Replaces file contents that a later read or write has superseded.
+
+    Messages are scanned once, as they are appended. For each file path the
+    newest message carrying its content is remembered; older copies are
+    rewritten into short stubs the next time `prune` runs, so only the
+    latest version of each file is resent with every request. A whole-file
+    read or write supersedes everything earlier for that path, while a
+    partial read only supersedes earlier reads of the same range. Paths
+    are compared in the absolute form the executor recorded when the tool
+    ran, so a relative path read from two directories names two files.
+    """
+
+    def __init__(self):
+        self._processed = 0
+        self._latest = {}
+        self._pending = []
+        self.reclaimed_tokens = 0
+
+    def _scan(self, ledger):
+        new = min(ledger.appended - self._processed, len(ledger.messages) - 1)
+        self._processed = ledger.appended
+        start = len(ledger.messages) - new
+        for index in range(start, len(ledger.messages)):
+            message = ledger.messages[index]
+            _, refs = _file_refs(message)
+            if not refs:
+                continue
+            # A write_file action takes the path its tool result recorded
+            following = ledger.messages[index + 1] if index + 1 < len(ledger.messages) else None
+            written = [resolved for _, resolved, _, _, field in _file_refs(following)[1]
+                       if field == "content"] if following and message.get("role") == "assistant" else []
+            for n, (path, resolved, window, _, field) in enumerate(refs):
+                if resolved is None and field == "content" and written:
+                    resolved = written.pop(0)
+                key = resolved or resolve(path)
+                windows = self._latest.setdefault(key, {})
+                superseded = list(windows.items()) if window is None else [(window, windows.get(window))]
+                for old_window, previous in superseded:
+                    if previous is not None and previous[0] is not message:
+                        self._pending.append(previous)
+                if window is None:
+                    windows.clear()
+                windows[window] = (message, n)
+
+    def prune(self, ledger):
+        """Stub out superseded contents; returns (messages pruned, tokens reclaimed)"""
+        self._scan(ledger)
+        if not self._pending:
+            return 0, 0
+
+        stale = {}
+        for message, n in self._pending:
+            stale.setdefault(id(message), set()).add(n)
+        self._pending = []
+
+        pruned = 0
+        before = ledger.conversation_tokens
+        for index, message in enumerate(ledger.messages):
+            refs_to_stub = stale.get(id(message))
+            if not refs_to_stub or index == 0:
+                continue
+            data, refs = _file_refs(message)
+            for n, (path, _, _, container, field) in enumerate(refs):
+                if n in refs_to_stub and not container[field].startswith("[omitted"):
+                    container[field] = (f"[omitted {len(container[field])} chars: superseded by a later "
+                                        f"read or write of {path}]")
+            stub = dict(message, content=json.dumps(data))
+            ledger.update(index, stub)
+            # Later references now point at the stub
+            for windows in self._latest.values():
+                for window, (latest, n) in windows.items():
+                    if latest is message:
+                        windows[window] = (stub, n)
+            pruned += 1
+
+        reclaimed = before - ledger.conversation_tokens
+        self.reclaimed_tokens += reclaimed
+        return pruned, reclaimed
+
+
+def _complete_summary(prompt, content):
+    """Run a summarization request on the cheaper model"""
+    summary_response = chat_completion(
+        model="gpt-4o-mini",  # Use cheaper model for summarization
+        messages=[
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": content}
+        ],
+        temperature=0.3,
+        max_tokens=500
+    )
+    return summary_response.choices[0].message.content
+
+def _summarize_messages(messages):
+    """Ask the summarization model for a summary of the given messages"""
+    summary_prompt = """Summarize the following conversation between a user and a coding assistant. 
+    Focus on: 1) What project was built, 2) Key features implemented, 3) Current state of the project.
+    Keep it concise but informative."""
+    
+    summary_content = "\n".join([msg["content"] for msg in messages])
+    return _complete_summary(summary_prompt, summary_content)
+
+def _merge_summaries(summaries):
+    """Fold consecutive segment summaries into one higher-level summary"""
+    merge_prompt = """Combine the following consecutive summaries of one session between a user and a coding assistant
+    into a single summary. Keep decisions, file names and the current state of the project; drop superseded details."""
+    
+    return _complete_summary(merge_prompt, "\n\n".join(summaries))
+
+
+class SummaryStore:
+    """Hierarchical store of conversation summaries.
+
+    Each compaction summarizes only the messages added since the previous
+    checkpoint into a new level-0 segment. When a level holds more than
+    `fanout` segments, the oldest ones are merged into a single segment one
+    level up, so raw messages are never summarized twice and merges only
+    ever read summaries.
+    """
+
+    def __init__(self, fanout=SUMMARY_FANOUT):
+        self.fanout = fanout
+        self.segments = []
+        self.message = None
+        self.compactions = []
+
+    def new_messages(self, messages, cut):
+        """Messages before `cut` that are not yet covered by a segment"""
+        start = 2 if len(messages) > 1 and messages[1] is self.message else 1
+        return messages[start:cut]
+
+    def summarize(self, messages):
+        """Return the segment list with `messages` folded in, without committing it.
+
+        Safe to run on a worker thread: the store itself is not modified.
+        """
+        segments = list(self.segments)
+        segments.append({"level": 0, "summary": _summarize_messages(messages), "messages": len(messages)})
+        level = 0
+        while True:
+            same_level = [i for i, seg in enumerate(segments) if seg["level"] == level]
+            if len(same_level) <= self.fanout:
+                break
+            merged = same_level[:self.fanout]
+            parent = {
+                "level": level + 1,
+                "summary": _merge_summaries([segments[i]["summary"] for i in merged]),
+                "messages": sum(segments[i]["messages"] for i in merged),
+            }
+            segments = segments[:merged[0]] + [parent] + segments[merged[-1] + 1:]
+            level += 1
+        return segments
+
+    def render(self, segments=None):
+        return "\n\n".join(seg["summary"] for seg in (segments or self.segments))
+
+    def commit(self, ledger, segments, cut, source_tokens):
+        """Replace messages[1:cut] with the summary of `segments` and record the savings"""
+        messages = ledger.messages
+        summary_msg = {"role": "system", "content": f"CONTEXT SUMMARY: {self.render(segments)}"}
+        self.segments = segments
+        self.message = summary_msg
+        # Messages appended while a background job ran are kept after the summary
+        ledger.replace([messages[0], summary_msg] + messages[cut:])
+        summary_tokens = ledger.token_count(1)
+        stats = {
+            "source_tokens": source_tokens,
+            "summary_tokens": summary_tokens,
+            "saved_tokens": source_tokens - summary_tokens,
+            "segments": len(segments),
+        }
+        self.compactions.append(stats)
+        return stats
+
+    def restore(self, messages, segments):
+        """Adopt the segments of a resumed session whose summary message is messages[1]"""
+        self.segments = list(segments)
+        if segments and len(messages) > 1 and str(messages[1].get("content", "")).startswith("CONTEXT SUMMARY:"):
+            self.message = messages[1]
+
+    @property
+    def total_saved_tokens(self):
+        return sum(c["saved_tokens"] for c in self.compactions)
+
+
+def _source_tokens(ledger, cut):
+    return sum(ledger.token_count(i) for i in range(1, cut))
+
+class BackgroundCompactor:
+    """Summarizes the ledger on a worker thread before it hits its budget.
+
+    Once the conversation crosses the soft watermark, the messages added
+    since the last checkpoint (up to the recent tail) are summarized in the
+    background. The result is swapped in at the next turn boundary; the
+    caller only waits when the hard budget is exceeded and the job is still
+    running. Status lines go to `log`.
+    """
+
+    def __init__(self, ledger, soft_ratio=SOFT_WATERMARK, store=None, log=print):
+        self.ledger = ledger
+        self.log = log
+        self.soft_ratio = soft_ratio
+        self.store = store or SummaryStore()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compactor")
+        self._future = None
+        self._cut = 0
+        self._source_tokens = 0
+
+    def _start(self):
+        messages = list(self.ledger.messages)
+        cut = len(messages) - RECENT_MESSAGES
+        new_messages = self.store.new_messages(messages, cut) if cut > 1 else []
+        if not new_messages:
+            return False
+        self._cut = cut
+        self._source_tokens = _source_tokens(self.ledger, cut)
+        # The job runs in a copy of the caller's context, so it is traced with the session
+        self._future = self._executor.submit(contextvars.copy_context().run, self._summarize, new_messages)
+        self.log(f"🔄 Compacting context in the background ({self.ledger.conversation_tokens} tokens)...")
+        return True
+
+    def _summarize(self, messages):
+        with span("compaction", "context", messages=len(messages), source_tokens=self._source_tokens) as attrs:
+            segments = self.store.summarize(messages)
+            attrs["segments"] = len(segments)
+            return segments
+
+    def _swap(self):
+        future = self._future
+        self._future = None
+        try:
+            segments = future.result()
+        except Exception as e:
+            self.log(f"Error summarizing context: {e}")
+            return
+        stats = self.store.commit(self.ledger, segments, self._cut, self._source_tokens)
+        self.log(f"🔄 Context compacted: saved {stats['saved_tokens']} tokens "
+              f"({stats['segments']} summary segments, {self.ledger.conversation_tokens} tokens in context)")
+
+    def turn_boundary(self):
+        """Apply a finished compaction and start a new one when needed"""
+        ledger = self.ledger
+        if self._future is None:
+            if ledger.conversation_tokens <= ledger.budget * self.soft_ratio:
+                return
+            if not self._start():
+                return
+        if not self._future.done():
+            if not ledger.over_budget():
+                return
+            self.log("⏳ Context over budget, waiting for background compaction...")
+            with span("compaction_wait", "context"):
+                wait([self._future])
+        self._swap()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,185 @@
+import json
+import re
+import threading
+
+from llm_client import chat_completion
+
+# Continuation requests for one truncated reply before giving up on it
+MAX_CONTINUATIONS = 2
+
+CONTINUE_PROMPT = ("Your previous reply was cut off by the length limit. Continue it exactly where it "
+                   "stopped: output only the remaining characters, without repeating anything or adding "
+                   "code fences.")
+
+# How each reply was turned into a step
+RECOVERY_STATS = {
+    "clean": 0,
+    "repaired": 0,
+    "continued": 0,
+    "rerequested": 0,
+    "failed": 0,
+}
+_stats_lock = threading.Lock()
+
+def count_recovery(path):
+    with _stats_lock:
+        RECOVERY_STATS[path] += 1
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+def _scan(text):
+    """Walk JSON text from its first '{'.
+
+    Returns (end index or None, open brackets, in string, comma positions).
+    """
+    stack = []
+    commas = []
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            commas.append(i)
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return i + 1, [], False, commas
+    return None, stack, in_string, commas
+
+def _close(text):
+    """Close an unterminated string and open brackets of truncated JSON text"""
+    _, stack, in_string, _ = _scan(text)
+    if in_string:
+        if text.endswith("\\") and not text.endswith("\\\\"):
+            text = text[:-1]
+        text += '"'
+    text = text.rstrip().rstrip(",").rstrip()
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join("}" if b == "{" else "]" for b in reversed(stack))
+
+def _strip_trailing_commas(text):
+    """Remove commas directly before a closing bracket, outside strings"""
+    out = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            out.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+        out.append(ch)
+    return "".join(out)
+
+def repair_json(text):
+    """Parse the first JSON object in text, fixing common slips.
+
+    Strips code fences and surrounding prose, drops trailing commas, and
+    closes an unterminated string and any open brackets. Returns
+    (value, truncated) where `truncated` tells whether anything had to be
+    closed; raises json.JSONDecodeError when the text cannot be repaired.
+    """
+    text = _FENCE.sub("", text)
+    start = text.find("{")
+    if start < 0:
+        raise json.JSONDecodeError("no JSON object found", text, 0)
+    text = text[start:]
+    end, _, _, commas = _scan(text)
+    if end is not None:
+        return json.loads(_strip_trailing_commas(text[:end])), False
+    # Close the text as it is; if a half-written key or value is in the
+    # way, cut back to the previous comma and try again
+    for cut in [len(text)] + commas[::-1]:
+        try:
+            return json.loads(_strip_trailing_commas(_close(text[:cut]))), True
+        except json.JSONDecodeError as e:
+            error = e
+    raise error
+
+
+def _continue(request, partial):
+    """Ask the model for the rest of a reply cut off at max_tokens; returns (text, finish_reason)"""
+    messages = list(request["messages"]) + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+    options = {k: v for k, v in request.items() if k not in ("messages", "response_format", "stream")}
+    response = chat_completion(messages=messages, **options)
+    choice = response.choices[0]
+    return _FENCE.sub("", choice.message.content or ""), choice.finish_reason
+
+def recover_step(reply, finish_reason, request):
+    """Turn a completion into a step dict as cheaply as possible.
+
+    Valid JSON is used as is. A reply cut off by the length limit is first
+    completed by asking only for its tail. Otherwise the text is repaired
+    locally; a truncated action is never repaired, since it would run with
+    partial input. Returns (reply, parsed); raises json.JSONDecodeError when
+    only a fresh request can help.
+    """
+    try:
+        parsed = json.loads(reply)
+        count_recovery("clean")
+        return reply, parsed
+    except json.JSONDecodeError:
+        pass
+
+    text = reply
+    for _ in range(MAX_CONTINUATIONS if finish_reason == "length" else 0):
+        try:
+            tail, finish_reason = _continue(request, text)
+        except Exception:
+            break
+        if tail.lstrip().startswith('{"step"'):
+            text = tail      # the model started over instead of continuing
+        else:
+            text += tail
+        try:
+            parsed, truncated = repair_json(text)
+        except json.JSONDecodeError:
+            continue
+        if not truncated:
+            count_recovery("continued")
+            return json.dumps(parsed), parsed
+        if finish_reason != "length":
+            break
+
+    try:
+        parsed, truncated = repair_json(text)
+    except json.JSONDecodeError:
+        count_recovery("failed")
+        raise
+    if not isinstance(parsed, dict) or (truncated and parsed.get("step") == "action"):
+        count_recovery("failed")
+        raise json.JSONDecodeError("reply is truncated and cannot be completed safely", reply, len(reply))
+    count_recovery("repaired")
+    return json.dumps(parsed), parsed
+
+def recovery_summary():
+    """One line of reply recovery counters"""
+    with _stats_lock:
+        s = dict(RECOVERY_STATS)
+    return (f"Replies: {s['clean']} clean, {s['repaired']} repaired locally, {s['continued']} completed "
+            f"by continuation, {s['rerequested']} re-requested, {s['failed']} unrecoverable")
@@ -0,0 +1,260 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+import openai
+from dotenv import load_dotenv
+
+import response_cache
+from tools.tracing import span
+
+load_dotenv()
+
+# Connection pool shared by every request to the API
+POOL_CONNECTIONS = 10
+POOL_KEEPALIVE = 5
+KEEPALIVE_EXPIRY = 60.0
+CONNECT_TIMEOUT = 10.0
+
+# Seconds one request may take, and all attempts of a call together
+REQUEST_TIMEOUT = float(os.getenv("CODEXLITE_LLM_TIMEOUT", "60"))
+CALL_DEADLINE = float(os.getenv("CODEXLITE_LLM_DEADLINE", "180"))
+
+# Exponential backoff with full jitter between attempts
+MAX_ATTEMPTS = int(os.getenv("CODEXLITE_LLM_RETRIES", "4"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Consecutive failed attempts that open the circuit, and how long it stays open
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+# Errors worth another attempt: network trouble, rate limits and server faults
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,      # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    httpx.TransportError,           # raised as is while a stream is read
+)
+RETRYABLE_STATUS = {408, 409, 429}
+
+STATS = {
+    "requests": 0,
+    "attempts": 0,
+    "retries": 0,
+    "failures": 0,
+    "backoff_seconds": 0.0,
+    "circuit_opens": 0,
+    "rejected": 0,
+    "cached": 0,
+    "stream_errors": 0,
+}
+_stats_lock = threading.Lock()
+
+def _count(key, amount=1):
+    with _stats_lock:
+        STATS[key] += amount
+
+
+class LLMUnavailable(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+class StreamInterrupted(Exception):
+    """A transient error cut off a stream after it was opened; the request can be made again"""
+
+
+class CircuitBreaker:
+    """Stops calling the API after repeated failures.
+
+    After `threshold` consecutive failed attempts the circuit opens and
+    calls fail fast for `cooldown` seconds. Then one trial call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def before_call(self):
+        """Raise LLMUnavailable while open; returns True when this call is the half-open trial"""
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial):
+                remaining = self.cooldown - (time.monotonic() - self.opened_at)
+                raise LLMUnavailable(f"API circuit open after {self.failures} consecutive failures; "
+                                     f"retrying in {max(remaining, 0):.0f}s")
+            if state == "half-open":
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def end_trial(self):
+        """Let another trial through when a trial call ended without an outcome (e.g. interrupted)"""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            reopen = self._trial
+            self._trial = False
+            if reopen or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                _count("circuit_opens")
+
+
+breaker = CircuitBreaker()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the OpenAI client shared by the agent, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=POOL_CONNECTIONS,
+                    max_keepalive_connections=POOL_KEEPALIVE,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            )
+            # Retries happen here, where they can be counted and bounded by a deadline
+            _client = openai.OpenAI(http_client=http_client, max_retries=0)
+        return _client
+
+def set_client(client):
+    """Use another client object, e.g. a fake one in benchmarks"""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def is_retryable(error):
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+def _retry_after(error):
+    """Seconds the server asked us to wait, from rate-limit headers, or None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+    return None
+
+def backoff_delay(attempt, error=None):
+    """Delay before retry number `attempt` (from 1): the server's hint, or full jitter"""
+    hinted = _retry_after(error) if error is not None else None
+    if hinted is not None:
+        return min(hinted, BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def chat_completion(on_retry=None, deadline=CALL_DEADLINE, **request):
+    """Create a chat completion with retries, backoff, a deadline and the circuit breaker.
+
+    Streaming requests are retried only while the stream is being opened.
+    `on_retry(attempt, delay, error)` is called before each backoff sleep.
+    Each call is traced as an "api" span; for a stream it ends once the
+    stream is open. Depending on the response cache mode a stored reply is
+    returned instead of calling the API, and replies from the API are kept.
+    """
+    _count("requests")
+    give_up_at = time.monotonic() + deadline
+    request.setdefault("timeout", REQUEST_TIMEOUT)
+    attempt = 0
+    with span("chat_completion", "api", model=request.get("model"), stream=bool(request.get("stream")),
+              retries=0, backoff=0.0, cached=False) as attrs:
+        cached = response_cache.lookup(request)
+        if cached is not None:
+            _count("cached")
+            attrs["cached"] = True
+            return cached
+        while True:
+            try:
+                trial = breaker.before_call()
+            except LLMUnavailable:
+                _count("rejected")
+                raise
+            attempt += 1
+            _count("attempts")
+            try:
+                remaining = give_up_at - time.monotonic()
+                request["timeout"] = min(request["timeout"], max(remaining, 1.0))
+                response = get_client().chat.completions.create(**request)
+                breaker.record_success()
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    attrs["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+                    attrs["completion_tokens"] = getattr(usage, "completion_tokens", None)
+                return response_cache.record(request, response)
+            except Exception as error:
+                if not is_retryable(error):
+                    # The API answered (or was never reached); either way it is not down
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                delay = backoff_delay(attempt, error)
+                if attempt >= MAX_ATTEMPTS or time.monotonic() + delay >= give_up_at or breaker.state == "open":
+                    _count("failures")
+                    raise
+                if on_retry:
+                    on_retry(attempt, delay, error)
+                _count("retries")
+                _count("backoff_seconds", delay)
+                attrs["retries"] += 1
+                attrs["backoff"] += delay
+                time.sleep(delay)
+            finally:
+                if trial:
+                    breaker.end_trial()
+
+def stream_failed(error):
+    """Count a transient error while reading a stream against the breaker; returns it as StreamInterrupted"""
+    _count("stream_errors")
+    breaker.record_failure()
+    return StreamInterrupted(f"stream interrupted by {type(error).__name__}: {error}")
+
+def stats_summary():
+    """One line of API call counters"""
+    with _stats_lock:
+        s = dict(STATS)
+    line = (f"API calls: {s['requests']} ({s['attempts']} attempts, {s['retries']} retries, "
+            f"{s['failures']} failed, {s['cached']} cached, {s['stream_errors']} streams cut off) | Backoff: {s['backoff_seconds']:.1f}s | "
+            f"Circuit: {breaker.state}, opened {s['circuit_opens']}x, {s['rejected']} rejected")
+    cache = response_cache.summary()
+    return f"{line}\n{cache}" if cache else line
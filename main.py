@@ -1,29 +1,76 @@
+import os
+import argparse
 import signal
-import json
-import time
 from dotenv import load_dotenv
-from openai import OpenAI
 
-from tools import (
-    run_command, create_folder, write_file, read_file, list_files,
-    run_server, stop_servers, get_current_directory, find_files, check_port
-)
-from context_manager import should_summarize_context, summarize_context
-from prompts import SYSTEM_PROMPT
+from tools import stop_servers, status, get_current_directory
+from agent import Agent
+import response_cache
+from llm_client import stats_summary
+from json_recovery import recovery_summary
+from tools.tracing import stats_table, find_trace, load_trace, export_chrome
+from session_journal import SessionJournal, list_sessions
 
 load_dotenv()
-client = OpenAI()
 
-def main():
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+def _resume_session(session_id, agent):
+    """Load a saved session into the agent's ledger; returns its journal"""
+    if session_id == "last":
+        sessions = list_sessions()
+        if not sessions:
+            raise FileNotFoundError("no saved sessions to resume")
+        session_id = sessions[0]
+    journal = SessionJournal(session_id)
+    restored, segments, meta = journal.load()
+    agent.prompt.modules = list(meta.get("prompt_modules", agent.prompt.modules))
+    agent.ledger.replace(restored)
+    agent.compactor.store.restore(agent.ledger.messages, segments)
+    if meta.get("cwd") and os.path.isdir(meta["cwd"]):
+        os.chdir(meta["cwd"])
+    print(f"♻️ Resumed session {session_id}: {len(restored)} messages, {agent.ledger.conversation_tokens} tokens")
+    return journal
+
+def _print_stats(agent):
+    print(stats_table(agent.tracer.spans))
+    if agent.tracer.path:
+        print(f"📈 Trace: {agent.tracer.path} (export with: python main.py --trace --chrome trace.json)")
+
+def _report_trace(session, chrome=None):
+    """Print the stats of a saved trace and optionally export it for chrome://tracing"""
+    path = find_trace(None if session == "last" else session)
+    if path is None:
+        print("❌ No trace found")
+        return
+    spans = load_trace(path)
+    print(f"📈 Trace {path}: {len(spans)} spans")
+    print(stats_table(spans))
+    if chrome:
+        export_chrome(spans, chrome)
+        print(f"Chrome trace written to {chrome} (open in chrome://tracing or ui.perfetto.dev)")
+
+def main(resume=None):
+    agent = Agent()
+    try:
+        journal = _resume_session(resume, agent) if resume else SessionJournal()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"❌ Cannot resume session: {e}")
+        agent.close()
+        return
+    journal.attach(agent.ledger, agent.compactor.store)
+
+    def close_session():
+        agent.close()
+        journal.close()
     
     print("\n🚀 Enhanced Terminal Assistant Ready!")
     print("Available commands: build apps, modify code, manage servers, debug issues")
-    print("Type 'help' for examples or 'quit' to exit")
+    print("Type 'help' for examples, 'status' for running processes, 'stats' for latencies or 'quit' to exit")
+    print(f"📓 Session {journal.session_id} (resume with: python main.py --resume {journal.session_id})")
 
     def signal_handler(sig, frame):
         print("\n🛑 Shutting down gracefully...")
         stop_servers()
+        close_session()
         exit(0)
     
     signal.signal(signal.SIGINT, signal_handler)
@@ -34,6 +81,7 @@ def main():
             
             if user_input.lower() in ["exit", "quit"]:
                 stop_servers()
+                close_session()
                 print("👋 Goodbye!")
                 break
             
@@ -49,124 +97,66 @@ def main():
                 """)
                 continue
 
-            # Check if context should be summarized
-            if should_summarize_context(messages):
-                print("🔄 Summarizing context to improve performance...")
-                messages = summarize_context(messages)
-
-            messages.append({"role": "user", "content": user_input})
-
-            while True:
-                for attempt in range(3):
-                    try:
-                        response = client.chat.completions.create(
-                            model="gpt-4o",
-                            response_format={"type": "json_object"},
-                            messages=messages,
-                            temperature=0.3,
-                            max_tokens=2000
-                        )
-                        reply = response.choices[0].message.content
-                        parsed = json.loads(reply)
-                        break
-                    except json.JSONDecodeError as e:
-                        print(f"⚠️ JSON parsing error (attempt {attempt + 1}): {e}")
-                        if attempt == 2:
-                            print("❌ Failed to get valid JSON after 3 attempts")
-                            break
-                        time.sleep(1)
-                    except Exception as e:
-                        print(f"⚠️ API error (attempt {attempt + 1}): {e}")
-                        if attempt == 2:
-                            print("❌ Failed to get response after 3 attempts")
-                            break
-                        time.sleep(2)
-                else:
-                    break
-
-                print(f"\n🤖 Assistant: {reply}")
-                messages.append({"role": "assistant", "content": reply})
-
-                step = parsed.get("step")
-
-                if step == "plan":
-                    print(f"🔠 PLAN: {parsed['content']}")
-                    continue
-
-                elif step == "action":
-                    tool_name = parsed.get("tool")
-                    tool_input = parsed.get("input")
-                    print(f"⚙️ ACTION: {tool_name} → {tool_input}")
-                    
-                    # Map tool names to functions
-                    available_tools = {
-                        "run_command": run_command,
-                        "create_folder": create_folder,
-                        "write_file": write_file,
-                        "read_file": read_file,
-                        "list_files": list_files,
-                        "run_server": run_server,
-                        "stop_servers": stop_servers,
-                        "get_current_directory": get_current_directory,
-                        "find_files": find_files,
-                        "check_port": check_port,
-                    }
-                    
-                    if tool_name not in available_tools:
-                        print(f"❌ Unknown tool: {tool_name}")
-                        break
-
-                    result = available_tools[tool_name](tool_input)
-                    print(f"📤 OUTPUT: {result}")
-                    
-                    messages.append({
-                        "role": "user",
-                        "content": json.dumps({
-                            "step": "tool_output",
-                            "tool": tool_name,
-                            "input": tool_input,
-                            "output": result
-                        })
-                    })
-                    continue
-
-                elif step == "observe":
-                    print(f"👁️ OBSERVE: {parsed['content']}")
-                    continue
-
-                elif step == "complete":
-                    print(f"✅ COMPLETE: {parsed['content']}")
-                    print("=" * 60)
+            if user_input.lower() == "status":
+                print(status())
+                print(stats_summary())
+                print(recovery_summary())
+                print(agent.router.summary())
+                continue
 
-                    while True:
-                        follow_up = input("🛠️ Continue development? (yes/no/status): ").strip().lower()
-                        if follow_up in ["no", "n", "done", "finished", "exit"]:
-                            print("🎉 Project finalized.")
-                            return
-                        elif follow_up in ["yes", "y", "sure", "okay", "ok"]:
-                            next_change = input("📬 What would you like to add/modify? > ").strip()
-                            messages.append({"role": "user", "content": next_change})
-                            break
-                        elif follow_up == "status":
-                            print(f"📁 Current directory: {get_current_directory()}")
-                            # Note: We can't directly access running_processes from here
-                            # but the stop_servers function handles the process management
-                            continue
-                        else:
-                            print("❓ Please answer 'yes', 'no', or 'status'.")
-                    break
+            if user_input.lower() == "stats":
+                _print_stats(agent)
+                continue
 
+            agent.send(user_input)
+            outcome, _ = agent.run()
+            if outcome == "complete":
+                print("=" * 60)
+
+            while outcome == "complete":
+                follow_up = input("🛠️ Continue development? (yes/no/status/stats): ").strip().lower()
+                if follow_up in ["no", "n", "done", "finished", "exit"]:
+                    print("🎉 Project finalized.")
+                    close_session()
+                    return
+                elif follow_up in ["yes", "y", "sure", "okay", "ok"]:
+                    next_change = input("📬 What would you like to add/modify? > ").strip()
+                    agent.send(next_change)
+                    outcome, _ = agent.run()
+                    if outcome == "complete":
+                        print("=" * 60)
+                elif follow_up == "status":
+                    print(f"📁 {get_current_directory()}")
+                    print(status())
+                elif follow_up == "stats":
+                    _print_stats(agent)
                 else:
-                    print(f"❓ Unknown step: {step}")
-                    break
+                    print("❓ Please answer 'yes', 'no', 'status' or 'stats'.")
 
         except KeyboardInterrupt:
             print("\n🛑 Interrupted. Stopping servers...")
             stop_servers()
+            close_session()
             break
         except Exception as e:
             print(f"❌ Unexpected Error: {e}")
             continue
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="codexLite terminal assistant")
+    parser.add_argument("--resume", nargs="?", const="last", metavar="SESSION",
+                        help="continue a saved session (default: the most recent one)")
+    parser.add_argument("--sessions", action="store_true", help="list saved sessions and exit")
+    parser.add_argument("--trace", nargs="?", const="last", metavar="SESSION",
+                        help="show latency stats of a saved trace (default: the most recent one) and exit")
+    parser.add_argument("--chrome", metavar="OUT", help="with --trace, also export it in Chrome trace format")
+    parser.add_argument("--cache", choices=response_cache.MODES, default=response_cache.CACHE_MODE,
+                        help="response cache mode (default: $CODEXLITE_CACHE or off)")
+    args = parser.parse_args()
+    response_cache.set_mode(args.cache)
+    if args.sessions:
+        print("\n".join(list_sessions()) or "No saved sessions")
+    elif args.trace or args.chrome:
+        _report_trace(args.trace or "last", args.chrome)
+    else:
+        main(resume=args.resume)
\ No newline at end of file
@@ -0,0 +1,140 @@
+import os
+import re
+import statistics
+import time
+
+# The two models steps are routed between
+LARGE_MODEL = "gpt-4o"
+SMALL_MODEL = "gpt-4o-mini"
+
+# adaptive routes per step; large or small pins every step to one model
+ROUTING_MODE = os.getenv("CODEXLITE_ROUTING", "adaptive")
+
+# Requests with more prompt tokens than this always go to the large model
+SMALL_MODEL_MAX_PROMPT_TOKENS = 16000
+
+# Steps that stay on the large model after a parse failure or tool error
+ESCALATION_STEPS = 2
+
+# Seconds a routine step should take, and US dollars a session may spend
+LATENCY_BUDGET = float(os.getenv("CODEXLITE_STEP_LATENCY_BUDGET", "10"))
+COST_BUDGET = float(os.getenv("CODEXLITE_COST_BUDGET", "0")) or None
+
+# US dollars per million (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Weight of the newest sample in the moving latency average
+LATENCY_SMOOTHING = 0.3
+
+_EXIT_CODE = re.compile(r"\[exit code (-?\d+)")
+_ERROR_PREFIXES = ("Error", "Invalid input", "Input must be", "Edit rejected", "Patch rejected",
+                   "Command failed", "Command timed out", "Server failed", "Server started but", "⚠️", "❌")
+
+
+def is_tool_error(output):
+    """Whether a tool's output reports a failure"""
+    text = str(output).lstrip()
+    if text.startswith(_ERROR_PREFIXES):
+        return True
+    codes = _EXIT_CODE.findall(text)
+    return bool(codes) and codes[-1] != "0"
+
+
+class ModelRouter:
+    """Picks the model for each step of the agent loop.
+
+    New requests and steps that act on a plan or an observation go to the
+    large model. The step right after tools that all succeeded is usually a
+    short reaction and goes to the small one, unless the prompt is large.
+    A parse failure or tool error escalates the next few steps to the
+    large model. Routine steps avoid a model whose recent latency is over
+    budget, and once the session's cost budget is spent everything but
+    escalations uses the small model. Every decision is kept with its
+    latency and estimated cost.
+    """
+
+    def __init__(self, mode=ROUTING_MODE, latency_budget=LATENCY_BUDGET, cost_budget=COST_BUDGET):
+        self.mode = mode
+        self.latency_budget = latency_budget
+        self.cost_budget = cost_budget
+        self.last_step = None
+        self.escalation = 0
+        self.escalation_reason = None
+        self.latency = {}
+        self.cost = 0.0
+        self.decisions = []
+
+    def new_request(self):
+        """Note that the user has sent a message"""
+        self.last_step = None
+
+    def escalate(self, reason):
+        self.escalation = ESCALATION_STEPS
+        self.escalation_reason = reason
+
+    def observe_step(self, step):
+        self.last_step = step
+
+    def observe_results(self, results):
+        """Note the outcome of the tools run for an action step"""
+        failed = [r["tool"] for r in results if is_tool_error(r.get("output", ""))]
+        if failed:
+            self.escalate(f"{', '.join(failed)} failed")
+
+    def choose(self, prompt_tokens):
+        """Return (model, reason) for the next step"""
+        if self.mode == "large":
+            return LARGE_MODEL, "routing pinned to large"
+        if self.mode == "small":
+            return SMALL_MODEL, "routing pinned to small"
+        if self.escalation:
+            return LARGE_MODEL, f"escalated: {self.escalation_reason}"
+        if self.cost_budget is not None and self.cost >= self.cost_budget:
+            return SMALL_MODEL, f"cost budget ${self.cost_budget:.2f} spent"
+        if prompt_tokens > SMALL_MODEL_MAX_PROMPT_TOKENS:
+            return LARGE_MODEL, f"large prompt ({prompt_tokens} tokens)"
+        if self.last_step is None:
+            return LARGE_MODEL, "new request"
+        if self.last_step != "action":
+            return LARGE_MODEL, f"acting on {self.last_step}"
+        if self.latency.get(SMALL_MODEL, 0) > self.latency_budget >= self.latency.get(LARGE_MODEL, 0) > 0:
+            return LARGE_MODEL, "routine, small model over latency budget"
+        return SMALL_MODEL, "routine follow-up to successful tools"
+
+    def record(self, model, reason, latency, prompt_tokens, completion_tokens, ok=True):
+        """Log a finished request and update latency averages and spend"""
+        previous = self.latency.get(model)
+        self.latency[model] = latency if previous is None else (
+            LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * previous)
+        prompt_price, completion_price = MODEL_PRICES.get(model, MODEL_PRICES[LARGE_MODEL])
+        cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+        self.cost += cost
+        if self.escalation and ok:
+            self.escalation -= 1
+        decision = {
+            "time": time.time(),
+            "model": model,
+            "reason": reason,
+            "latency": latency,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": cost,
+            "ok": ok,
+        }
+        self.decisions.append(decision)
+        return decision
+
+    def summary(self):
+        """Steps, median latency and spend per model"""
+        if not self.decisions:
+            return "Model routing: no steps yet"
+        parts = []
+        for model in (LARGE_MODEL, SMALL_MODEL):
+            latencies = [d["latency"] for d in self.decisions if d["model"] == model]
+            if latencies:
+                parts.append(f"{model} {len(latencies)} steps, median {statistics.median(latencies):.2f}s")
+        overall = statistics.median(d["latency"] for d in self.decisions)
+        return f"Model routing: {'; '.join(parts)} | median step {overall:.2f}s | est. cost ${self.cost:.4f}"
@@ -0,0 +1,272 @@
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from types import SimpleNamespace
+
+from tools.snapshot_store import CODEXLITE_HOME
+
+# off, read-through (serve hits, call the API on a miss and keep the reply),
+# record (always call the API and keep the reply) or replay (never call the API)
+CACHE_MODE = os.getenv("CODEXLITE_CACHE", "off")
+MODES = ("off", "read-through", "record", "replay")
+
+CACHE_PATH = os.getenv("CODEXLITE_CACHE_PATH", os.path.join(CODEXLITE_HOME, "cache", "responses.sqlite"))
+
+# Least recently used replies are evicted past this size
+CACHE_MAX_BYTES = int(float(os.getenv("CODEXLITE_CACHE_MB", "256")) * 1024 * 1024)
+
+# Request fields that decide the reply; timeouts, streaming and callbacks do not
+KEY_FIELDS = ("model", "messages", "temperature", "response_format", "max_tokens")
+
+# Tool output that differs between otherwise identical runs: command and
+# server start times, and process ids
+VOLATILE = [
+    (re.compile(r"\| \d+\.\d+s\]"), "| _s]"),
+    (re.compile(r"ready after \d+\.\d+s"), "ready after _s"),
+    (re.compile(r"PID:? \d+"), "PID _"),
+]
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode for a request that was never recorded"""
+
+
+def cache_key(request):
+    """Stable hash of the fields of a chat completion request that decide its reply"""
+    fields = {name: request.get(name) for name in KEY_FIELDS}
+    text = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    for pattern, replacement in VOLATILE:
+        text = pattern.sub(replacement, text)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Chat completion replies stored in sqlite, keyed by `cache_key`.
+
+    Reply text is zlib-compressed. Each hit refreshes an entry's last-used
+    time, and once the stored replies pass `max_bytes` the least recently
+    used ones are deleted. One connection is shared by all threads; WAL
+    mode lets several processes use the same file.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, model TEXT, content BLOB, finish_reason TEXT,
+                prompt_tokens INTEGER, completion_tokens INTEGER, size INTEGER,
+                created REAL, used REAL)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        return self._db
+
+    def get(self, key):
+        """The stored reply as (content, finish_reason, prompt_tokens, completion_tokens), or None"""
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT content, finish_reason, prompt_tokens, completion_tokens "
+                             "FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            db.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+            self.stats["hits"] += 1
+            return (zlib.decompress(row[0]).decode("utf-8"),) + tuple(row[1:])
+
+    def put(self, key, model, content, finish_reason, prompt_tokens=None, completion_tokens=None):
+        """Store a reply, evicting the least recently used ones past the size cap"""
+        blob = zlib.compress(content.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            old = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (key, model, blob, finish_reason, prompt_tokens, completion_tokens, len(blob), now, now))
+            self._size += len(blob) - (old[0] if old else 0)
+            self.stats["stores"] += 1
+            if self._size > self.max_bytes:
+                self._evict(db)
+
+    def _evict(self, db):
+        # Other processes may have written too, so count again before deleting
+        self._size = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY used").fetchall():
+            if self._size <= self.max_bytes:
+                break
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size -= size
+            self.stats["evictions"] += 1
+
+    def info(self):
+        """Entry count and stored bytes"""
+        with self._lock:
+            db = self._connect()
+            count, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {"entries": count, "bytes": size}
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def _completion(content, finish_reason, prompt_tokens, completion_tokens):
+    message = SimpleNamespace(content=content)
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)],
+                           usage=usage, cached=True)
+
+def _chunk(content, finish_reason=None):
+    delta = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)])
+
+
+class CachedStream:
+    """A stored reply played back as a stream of one text chunk"""
+
+    cached = True
+
+    def __init__(self, content, finish_reason):
+        self._chunks = [_chunk(content), _chunk(None, finish_reason)]
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        pass
+
+
+class RecordingStream:
+    """Passes a live stream through and stores its text once it has ended.
+
+    A consumer that stops early (streaming dispatches a step before its
+    closing brace arrives) does not wait: the rest of the stream is read
+    on a background thread and then stored.
+    """
+
+    def __init__(self, stream, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+        self._parts = []
+        self._finish_reason = None
+        self._iterator = None
+        self._done = False
+
+    def _read(self, chunk):
+        if chunk.choices:
+            self._finish_reason = chunk.choices[0].finish_reason or self._finish_reason
+            if chunk.choices[0].delta.content:
+                self._parts.append(chunk.choices[0].delta.content)
+
+    def __iter__(self):
+        self._iterator = iter(self._stream)
+        for chunk in self._iterator:
+            self._read(chunk)
+            yield chunk
+        self._finish()
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._stream.close()
+            if self._finish_reason:
+                self._on_complete("".join(self._parts), self._finish_reason)
+
+    def _drain(self):
+        try:
+            for chunk in self._iterator:
+                self._read(chunk)
+        except Exception:
+            self._finish_reason = None      # incomplete; not worth storing
+        self._finish()
+
+    def close(self):
+        if self._done:
+            return
+        if self._iterator is None:
+            self._done = True
+            self._stream.close()
+        else:
+            threading.Thread(target=self._drain, name="cache-drain", daemon=True).start()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """The response cache shared by every request of this process"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+def set_mode(mode):
+    """Switch the cache mode, e.g. from a command line flag"""
+    global CACHE_MODE
+    if mode not in MODES:
+        raise ValueError(f"unknown cache mode {mode!r}; use one of {', '.join(MODES)}")
+    CACHE_MODE = mode
+
+def lookup(request):
+    """A stored reply for the request in the shape the API returns, or None to call the API.
+
+    Raises CacheMiss in replay mode when nothing was recorded.
+    """
+    if CACHE_MODE not in ("read-through", "replay"):
+        return None
+    stored = get_cache().get(cache_key(request))
+    if stored is None:
+        if CACHE_MODE == "replay":
+            raise CacheMiss(f"no recorded response for this {request.get('model')} request (cache in replay mode)")
+        return None
+    content, finish_reason, prompt_tokens, completion_tokens = stored
+    if request.get("stream"):
+        return CachedStream(content, finish_reason)
+    return _completion(content, finish_reason, prompt_tokens, completion_tokens)
+
+def record(request, response):
+    """Keep the API's reply when the cache records; returns the response to hand back"""
+    if CACHE_MODE not in ("read-through", "record"):
+        return response
+    key, model = cache_key(request), request.get("model")
+    if request.get("stream"):
+        return RecordingStream(response, lambda content, finish_reason: get_cache().put(
+            key, model, content, finish_reason))
+    choice = response.choices[0]
+    if choice.message.content is not None and choice.finish_reason:
+        usage = getattr(response, "usage", None)
+        get_cache().put(key, model, choice.message.content, choice.finish_reason,
+                        getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+    return response
+
+def summary():
+    """One line of cache counters, or an empty string while the cache is off"""
+    if CACHE_MODE == "off":
+        return ""
+    cache = get_cache()
+    info = cache.info()
+    s = cache.stats
+    return (f"Cache ({CACHE_MODE}): {s['hits']} hits, {s['misses']} misses, {s['stores']} stored, "
+            f"{s['evictions']} evicted | {info['entries']} entries, {info['bytes'] / 1024 / 1024:.1f} MB")
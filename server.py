@@ -0,0 +1,453 @@
+import os
+import re
+import hmac
+import json
+import time
+import uuid
+import signal
+import asyncio
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from dotenv import load_dotenv
+
+from tools import Workspace, use_workspace
+from tools.snapshot_store import SESSION_ID
+from agent import Agent
+from llm_client import STATS, get_client
+
+load_dotenv()
+
+SERVER_HOST = os.getenv("CODEXLITE_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("CODEXLITE_SERVER_PORT", "8765"))
+
+# Bearer token every request must carry when set; sessions run shell commands
+SERVER_TOKEN = os.getenv("CODEXLITE_SERVER_TOKEN")
+
+# Where each session's workspace is created, as <dir>/<tenant>/<session id>
+SERVER_WORKSPACES = os.getenv("CODEXLITE_SERVER_WORKSPACES", "workspaces")
+
+# Model requests one tenant may have in flight, across all its sessions
+TENANT_LLM_CONCURRENCY = int(os.getenv("CODEXLITE_TENANT_LLM_CONCURRENCY", "4"))
+
+# Open sessions per tenant, and agent runs in progress across the server
+MAX_SESSIONS_PER_TENANT = int(os.getenv("CODEXLITE_MAX_SESSIONS_PER_TENANT", "20"))
+MAX_RUNNING_SESSIONS = int(os.getenv("CODEXLITE_MAX_RUNNING_SESSIONS", "16"))
+
+# Model steps one message may take before its run is stopped
+MAX_STEPS = 60
+
+# Events kept per session so a reconnecting client can catch up
+EVENT_HISTORY = 500
+
+# Seconds between SSE keepalive comments
+HEARTBEAT_INTERVAL = 15
+
+# Largest request body accepted
+MAX_BODY_BYTES = 1024 * 1024
+
+# Seconds of history behind the per-second rates in /metrics
+METRICS_WINDOW = 60
+
+# Step latencies kept for percentiles
+LATENCY_SAMPLES = 2000
+
+_TENANT = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class HTTPError(Exception):
+    """An error answered with its status code and message"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class Session:
+    """One tenant's conversation: its own agent, message history, workspace and event stream.
+
+    The agent runs on a server worker thread inside the session's
+    Workspace, so its relative paths, shell, servers and tool threads are
+    private to the session. Steps, tool results and log lines are
+    published as numbered events; SSE subscribers receive them live and
+    can resume from the last id they saw.
+    """
+
+    def __init__(self, server, tenant):
+        self.server = server
+        self.id = uuid.uuid4().hex[:12]
+        self.tenant = tenant
+        self.created = time.time()
+        self.last_active = self.created
+        self.state = "idle"         # idle | queued | running | closed
+        self.outcome = None
+        self.events = deque(maxlen=EVENT_HISTORY)
+        self.subscribers = set()
+        self._next_event = 1
+        self._task = None
+        self._state_lock = threading.Lock()
+        root = os.path.join(server.workspaces_dir, tenant, self.id)
+        os.makedirs(root, exist_ok=True)
+        self.workspace = Workspace(root, name=f"{tenant}-{self.id}")
+        self.agent = Agent(log=self._log, echo=False, on_event=self._threadsafe_publish,
+                           llm_slots=server.tenant_slots(tenant), session_id=f"{SESSION_ID}-{tenant}-{self.id}")
+
+    def info(self):
+        return {
+            "id": self.id,
+            "tenant": self.tenant,
+            "state": self.state,
+            "outcome": self.outcome,
+            "workspace": self.workspace.cwd,
+            "created": self.created,
+            "last_active": self.last_active,
+            "steps": self.agent.steps,
+            "messages": len(self.agent.ledger.messages),
+            "context_tokens": self.agent.ledger.conversation_tokens,
+            "last_event": self._next_event - 1,
+            "trace": self.agent.tracer.path,
+        }
+
+    def publish(self, event):
+        """Number an event, keep it and hand it to every subscriber; call on the event loop"""
+        event = {"id": self._next_event, "time": time.time(), **event}
+        self._next_event += 1
+        self.events.append(event)
+        if event["type"] == "step":
+            self.server.record_step(event["latency"])
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A client this far behind reconnects with Last-Event-ID
+                self.subscribers.discard(queue)
+
+    def _threadsafe_publish(self, event):
+        self.server.loop.call_soon_threadsafe(self.publish, event)
+
+    def _log(self, message):
+        self._threadsafe_publish({"type": "log", "message": message.strip()})
+
+    def _run_blocking(self, content):
+        # Under the lock so a close either comes first or sees the message and stops the run
+        with self._state_lock:
+            if self.state == "closed":
+                return "stopped", "session closed"
+            self.state = "running"
+            self.agent.send(content)
+        self._threadsafe_publish({"type": "state", "state": "running"})
+        with use_workspace(self.workspace):
+            return self.agent.run(max_steps=MAX_STEPS)
+
+    def start(self, content):
+        """Queue a run on a user message; call on the event loop so a second message sees it busy"""
+        self.state = "queued"
+        self._task = asyncio.create_task(self.run(content))
+
+    async def run(self, content):
+        """Run the agent on a user message and publish its outcome"""
+        self.last_active = time.time()
+        self.publish({"type": "message", "content": content})
+        try:
+            outcome, result = await self.server.loop.run_in_executor(
+                self.server.runners, self._run_blocking, content)
+        except Exception as e:
+            outcome, result = "error", f"{type(e).__name__}: {e}"
+        self.outcome = outcome
+        self.last_active = time.time()
+        if self.state != "closed":
+            self.state = "idle"
+        self.publish({"type": "done", "outcome": outcome, "content": result})
+
+    async def close(self):
+        """Stop the agent, its servers and its shell; the workspace files are kept"""
+        with self._state_lock:
+            self.state = "closed"
+            self.agent.stop()
+        if self._task is not None:
+            # A run in progress returns before its next step; it still uses the shell and tool pool
+            await self._task
+        await self.server.loop.run_in_executor(None, self.workspace.close)
+        self.agent.close()
+        self.publish({"type": "closed"})
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        self.subscribers.clear()
+
+
+class AgentServer:
+    """HTTP/SSE front end hosting many agent sessions in one process.
+
+    Requests are handled on one asyncio loop; agent runs happen on a
+    bounded pool of worker threads and share the pooled API client. Each
+    tenant has a semaphore capping its model requests in flight, and the
+    server keeps session and step-latency metrics for /metrics.
+    """
+
+    def __init__(self, workspaces_dir=SERVER_WORKSPACES, token=SERVER_TOKEN,
+                 max_running=MAX_RUNNING_SESSIONS, tenant_llm_concurrency=TENANT_LLM_CONCURRENCY):
+        self.workspaces_dir = os.path.abspath(workspaces_dir)
+        self.token = token
+        self.tenant_llm_concurrency = tenant_llm_concurrency
+        self.sessions = {}
+        self.runners = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="session")
+        self.loop = None
+        self.started = time.time()
+        self._tenant_slots = {}
+        self._slots_lock = threading.Lock()
+        self._session_starts = deque()
+        self._step_times = deque()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.sessions_created = 0
+        self.steps_total = 0
+
+    def tenant_slots(self, tenant):
+        with self._slots_lock:
+            slots = self._tenant_slots.get(tenant)
+            if slots is None:
+                slots = self._tenant_slots[tenant] = threading.BoundedSemaphore(self.tenant_llm_concurrency)
+            return slots
+
+    def record_step(self, latency):
+        self.steps_total += 1
+        self._step_times.append(time.time())
+        self._latencies.append(latency)
+
+    def _trim(self, times):
+        cutoff = time.time() - METRICS_WINDOW
+        while times and times[0] < cutoff:
+            times.popleft()
+        return len(times)
+
+    def metrics(self):
+        latencies = list(self._latencies)
+        window = min(METRICS_WINDOW, max(time.time() - self.started, 1))
+        tenants = {}
+        for session in self.sessions.values():
+            counts = tenants.setdefault(session.tenant, {"sessions": 0, "running": 0})
+            counts["sessions"] += 1
+            counts["running"] += session.state in ("queued", "running")
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "sessions": {
+                "open": len(self.sessions),
+                "running": sum(s.state == "running" for s in self.sessions.values()),
+                "queued": sum(s.state == "queued" for s in self.sessions.values()),
+                "created": self.sessions_created,
+                "per_sec": round(self._trim(self._session_starts) / window, 3),
+            },
+            "steps": {
+                "total": self.steps_total,
+                "per_sec": round(self._trim(self._step_times) / window, 3),
+                "latency_p50": _percentile(latencies, 0.5),
+                "latency_p95": _percentile(latencies, 0.95),
+                "latency_max": max(latencies) if latencies else None,
+            },
+            "tenants": tenants,
+            "api": dict(STATS),
+        }
+
+    def _session(self, tenant, session_id):
+        session = self.sessions.get(session_id)
+        if session is None or session.tenant != tenant:
+            raise HTTPError(404, f"no session {session_id}")
+        return session
+
+    async def create_session(self, tenant):
+        if sum(s.tenant == tenant for s in self.sessions.values()) >= MAX_SESSIONS_PER_TENANT:
+            raise HTTPError(429, f"tenant {tenant} already has {MAX_SESSIONS_PER_TENANT} open sessions")
+        session = await self.loop.run_in_executor(None, Session, self, tenant)
+        self.sessions[session.id] = session
+        self.sessions_created += 1
+        self._session_starts.append(time.time())
+        return session
+
+    async def close_session(self, session):
+        self.sessions.pop(session.id, None)
+        await session.close()
+
+    async def route(self, method, path, query, headers, body, writer):
+        """Dispatch a request; returns (status, payload), or None once an event stream has ended"""
+        if self.token:
+            given = headers.get("authorization", "")
+            if not hmac.compare_digest(given.encode(), f"Bearer {self.token}".encode()):
+                raise HTTPError(401, "missing or wrong bearer token")
+        if path == "/metrics" and method == "GET":
+            return 200, self.metrics()
+
+        tenant = headers.get("x-tenant") or query.get("tenant", ["default"])[0]
+        if not _TENANT.match(tenant):
+            raise HTTPError(400, "tenant must be 1-64 letters, digits, '.', '_' or '-'")
+        parts = [p for p in path.split("/") if p]
+        if not parts or parts[0] != "sessions" or len(parts) > 3:
+            raise HTTPError(404, f"no route for {path}")
+
+        if len(parts) == 1:
+            if method == "GET":
+                return 200, {"sessions": [s.info() for s in self.sessions.values() if s.tenant == tenant]}
+            if method == "POST":
+                return 201, (await self.create_session(tenant)).info()
+            raise HTTPError(405, f"{method} not allowed on {path}")
+
+        session = self._session(tenant, parts[1])
+        action = parts[2] if len(parts) == 3 else None
+        if action is None:
+            if method == "GET":
+                return 200, session.info()
+            if method == "DELETE":
+                await self.close_session(session)
+                return 200, session.info()
+        elif action == "messages" and method == "POST":
+            try:
+                content = json.loads(body or b"{}").get("content")
+            except (json.JSONDecodeError, AttributeError):
+                raise HTTPError(400, "body must be a JSON object with 'content'")
+            if not isinstance(content, str) or not content.strip():
+                raise HTTPError(400, "'content' must be a non-empty string")
+            if session.state != "idle":
+                raise HTTPError(409, f"session is {session.state}; wait for its done event or stop it")
+            session.start(content.strip())
+            return 202, session.info()
+        elif action == "stop" and method == "POST":
+            session.agent.stop()
+            return 202, session.info()
+        elif action == "events" and method == "GET":
+            after = headers.get("last-event-id") or query.get("after", ["0"])[0]
+            await self.stream_events(session, int(after or 0), writer)
+            return None
+        raise HTTPError(405 if action in (None, "messages", "stop", "events") else 404,
+                        f"{method} not allowed on {path}")
+
+    async def stream_events(self, session, after, writer):
+        """Send a session's events as SSE, replaying those after `after`, until it closes or the client leaves"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        queue = asyncio.Queue(maxsize=EVENT_HISTORY)
+        session.subscribers.add(queue)
+        try:
+            last = after
+            for event in list(session.events):
+                if event["id"] > last:
+                    writer.write(_sse(event))
+                    last = event["id"]
+            await writer.drain()
+            while session.state != "closed" or not queue.empty():
+                try:
+                    event = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    if queue not in session.subscribers:
+                        break
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                if event is None:
+                    break
+                if event["id"] > last:
+                    writer.write(_sse(event))
+                    last = event["id"]
+                    await writer.drain()
+        finally:
+            session.subscribers.discard(queue)
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, path, query, headers, body = await _read_request(reader)
+                result = await self.route(method, path, query, headers, body, writer)
+            except HTTPError as e:
+                result = e.status, {"error": str(e)}
+            except Exception as e:
+                result = 500, {"error": f"{type(e).__name__}: {e}"}
+            if result is not None:
+                status, payload = result
+                _write_json(writer, status, payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=SERVER_HOST, port=SERVER_PORT):
+        """Serve until cancelled, then close every session"""
+        self.loop = asyncio.get_running_loop()
+        os.makedirs(self.workspaces_dir, exist_ok=True)
+        get_client()    # create the shared pool before the workers race for it
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"🚀 codexLite server on http://{host}:{port} (workspaces in {self.workspaces_dir})")
+        if not self.token:
+            print("⚠️ CODEXLITE_SERVER_TOKEN is not set: anyone who can reach this port can run commands")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for session in list(self.sessions.values()):
+                await self.close_session(session)
+            self.runners.shutdown(wait=False, cancel_futures=True)
+
+
+async def _read_request(reader):
+    """Parse an HTTP/1.1 request into (method, path, query, headers, body)"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, "request headers too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"request body over {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    return method.upper(), url.path, parse_qs(url.query), headers, body
+
+def _write_json(writer, status, payload):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+
+def _sse(event):
+    data = json.dumps(event, default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n".encode("utf-8")
+
+
+def _terminate(sig, frame):
+    raise KeyboardInterrupt
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve codexLite sessions over HTTP with SSE step events")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("-w", "--workspaces", default=SERVER_WORKSPACES,
+                        help="directory holding one workspace per session")
+    args = parser.parse_args()
+
+    server = AgentServer(workspaces_dir=args.workspaces)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\n🛑 Server stopped; sessions closed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from tools.snapshot_store import CODEXLITE_HOME, SESSION_ID
+from tools.workspace import getcwd
+
+SESSIONS_DIR = os.path.join(CODEXLITE_HOME, "sessions")
+
+# Journal entries between automatic checkpoints
+CHECKPOINT_EVERY = 50
+
+# Message contents longer than this are stored out of line
+INLINE_LIMIT = 2000
+
+
+class SessionJournal:
+    """Append-only record of a session's messages, for resuming it later.
+
+    Every change to the ledger is appended to journal.jsonl as it happens.
+    A checkpoint holds the full message list (with the summary segments and
+    session metadata) and the journal offset it covers, so resuming reads
+    the checkpoint and replays only the entries written after it. Large
+    message contents are stored once under blobs/ and referenced by hash.
+    """
+
+    def __init__(self, session_id=None, root=SESSIONS_DIR):
+        self.session_id = session_id or SESSION_ID
+        self.dir = os.path.join(root, self.session_id)
+        self.journal_path = os.path.join(self.dir, "journal.jsonl")
+        self.checkpoint_path = os.path.join(self.dir, "checkpoint.json")
+        self.blob_dir = os.path.join(self.dir, "blobs")
+        self.ledger = None
+        self.store = None
+        self.meta = {}
+        self._file = None
+        self._since_checkpoint = 0
+
+    def attach(self, ledger, store=None):
+        """Journal every later change to the ledger; `store` supplies summary segments"""
+        self.ledger = ledger
+        self.store = store
+        ledger.journal = self
+        self.checkpoint()
+
+    def _encode(self, message):
+        content = message.get("content")
+        if not isinstance(content, str) or len(content) <= INLINE_LIMIT:
+            return message
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        path = os.path.join(self.blob_dir, digest)
+        if not os.path.exists(path):
+            os.makedirs(self.blob_dir, exist_ok=True)
+            _write_atomic(path, content)
+        encoded = {k: v for k, v in message.items() if k != "content"}
+        encoded["content_ref"] = digest
+        return encoded
+
+    def _decode(self, message):
+        if "content_ref" not in message:
+            return message
+        with open(os.path.join(self.blob_dir, message["content_ref"]), encoding="utf-8") as f:
+            content = f.read()
+        decoded = {k: v for k, v in message.items() if k != "content_ref"}
+        decoded["content"] = content
+        return decoded
+
+    def _write(self, entry):
+        if self._file is None:
+            os.makedirs(self.dir, exist_ok=True)
+            torn = False
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path):
+                with open(self.journal_path, "rb") as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+            if torn:
+                # Start on a fresh line after a partial entry left by a crash
+                self._file.write("\n")
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= CHECKPOINT_EVERY:
+            self.checkpoint()
+
+    def on_append(self, message):
+        self._write({"op": "append", "msg": self._encode(message)})
+
+    def on_update(self, index, message):
+        self._write({"op": "update", "index": index, "msg": self._encode(message)})
+
+    def on_system(self, message):
+        self._write({"op": "system", "msg": self._encode(message)})
+
+    def on_replace(self):
+        # Compaction rewrote the history; a checkpoint is cheaper than journaling it
+        self.checkpoint()
+
+    def note(self, **meta):
+        """Record session metadata, e.g. the loaded prompt modules"""
+        self.meta.update(meta)
+        self._write({"op": "meta", **meta})
+
+    def checkpoint(self):
+        """Write the current messages and the journal offset they cover"""
+        if self.ledger is None:
+            return
+        if self._file is not None:
+            self._file.flush()
+        offset = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        self.meta["cwd"] = getcwd()
+        data = {
+            "session": self.session_id,
+            "saved": time.time(),
+            "journal_offset": offset,
+            "messages": [self._encode(m) for m in self.ledger.messages],
+            "summary_segments": list(self.store.segments) if self.store is not None else [],
+            "meta": dict(self.meta),
+        }
+        os.makedirs(self.dir, exist_ok=True)
+        _write_atomic(self.checkpoint_path, json.dumps(data))
+        self._since_checkpoint = 0
+
+    def load(self):
+        """Rebuild (messages, summary segments, metadata) from the checkpoint and the journal tail"""
+        messages, segments, offset = [], [], 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                data = json.load(f)
+            messages = [self._decode(m) for m in data["messages"]]
+            segments = data.get("summary_segments", [])
+            offset = data.get("journal_offset", 0)
+            self.meta.update(data.get("meta", {}))
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue    # an entry torn by a crash
+                    op = entry.pop("op", None)
+                    if op == "append":
+                        messages.append(self._decode(entry["msg"]))
+                    elif op == "update" and entry["index"] < len(messages):
+                        messages[entry["index"]] = self._decode(entry["msg"])
+                    elif op == "system":
+                        if messages:
+                            messages[0] = self._decode(entry["msg"])
+                        else:
+                            messages.append(self._decode(entry["msg"]))
+                    elif op == "meta":
+                        self.meta.update(entry)
+        if not messages:
+            raise FileNotFoundError(f"no saved messages for session {self.session_id}")
+        return messages, segments, dict(self.meta)
+
+    def close(self):
+        """Checkpoint and close the journal"""
+        try:
+            self.checkpoint()
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def list_sessions(root=SESSIONS_DIR):
+    """Saved session ids, most recently active first"""
+    if not os.path.isdir(root):
+        return []
+    sessions = []
+    for name in os.listdir(root):
+        directory = os.path.join(root, name)
+        files = [os.path.join(directory, f) for f in ("journal.jsonl", "checkpoint.json")]
+        mtimes = [os.path.getmtime(f) for f in files if os.path.exists(f)]
+        if mtimes:
+            sessions.append((max(mtimes), name))
+    return [name for _, name in sorted(sessions, reverse=True)]
@@ -0,0 +1,238 @@
+import json
+import sys
+import time
+
+from llm_client import chat_completion, is_retryable, stream_failed
+from json_recovery import count_recovery, recover_step
+
+# Top-level string fields whose text is surfaced while it is still streaming
+STREAMED_KEYS = ("content",)
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class StepStreamParser:
+    """Incremental parser for a single streamed step object.
+
+    Tracks the top level of the JSON object as characters arrive. Each
+    top-level field is decoded as soon as its value closes, and text of
+    STREAMED_KEYS fields is handed to `on_text` while it is still open.
+    """
+
+    def __init__(self, on_text=None):
+        self.on_text = on_text
+        self.text = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._phase = "start"       # start | key | colon | value | after_value
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._value_is_string = False
+        self._unicode = None        # pending \uXXXX digits in a streamed string
+
+    def feed(self, chunk):
+        """Consume a chunk of streamed text"""
+        self.text += chunk
+        emitted = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            ch = text[i]
+            streaming = (self._in_string and self._depth == 1 and self._phase == "value"
+                         and self._value_is_string and self._key in STREAMED_KEYS)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    if streaming:
+                        if ch == 'u':
+                            self._unicode = ""
+                        else:
+                            emitted.append(_ESCAPES.get(ch, ch))
+                elif self._unicode is not None:
+                    self._unicode += ch
+                    if len(self._unicode) == 4:
+                        try:
+                            emitted.append(chr(int(self._unicode, 16)))
+                        except ValueError:
+                            pass
+                        self._unicode = None
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._phase == "key":
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._phase = "colon"
+                    elif self._depth == 1 and self._phase == "value":
+                        self._close_value(i + 1)
+                elif streaming:
+                    emitted.append(ch)
+                continue
+
+            if ch.isspace():
+                continue
+
+            if self._phase == "start":
+                if ch == '{':
+                    self._depth = 1
+                    self._phase = "key"
+                continue
+
+            if self._depth == 1:
+                if self._phase == "key":
+                    if ch == '"':
+                        self._in_string = True
+                        self._key_start = i
+                    elif ch == '}':
+                        self._finish()
+                elif self._phase == "colon":
+                    if ch == ':':
+                        self._phase = "value"
+                        self._value_start = None
+                elif self._phase == "value":
+                    if self._value_start is None:
+                        self._value_start = i
+                        self._value_is_string = ch == '"'
+                        if ch == '"':
+                            self._in_string = True
+                        elif ch in '{[':
+                            self._depth += 1
+                    elif ch in ',}':
+                        # end of a bare literal (number, true, false, null)
+                        self._close_value(i)
+                        if ch == '}':
+                            self._finish()
+                        else:
+                            self._phase = "key"
+                elif self._phase == "after_value":
+                    if ch == ',':
+                        self._phase = "key"
+                    elif ch == '}':
+                        self._finish()
+                continue
+
+            # Inside a nested object or array value
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 1:
+                    self._close_value(i + 1)
+
+        self._pos = len(text)
+        if emitted and self.on_text:
+            self.on_text(self._key, "".join(emitted))
+
+    def _close_value(self, end):
+        try:
+            self.fields[self._key] = json.loads(self.text[self._value_start:end])
+        except json.JSONDecodeError:
+            pass
+        self._phase = "after_value"
+        self._value_start = None
+
+    def _finish(self):
+        self._depth = 0
+        self.done = True
+
+    def is_dispatchable(self):
+        """An action can run once its step and its tool/input (or actions) fields are closed"""
+        return (self.fields.get("step") == "action"
+                and ("actions" in self.fields or ("tool" in self.fields and "input" in self.fields)))
+
+
+class StepPrinter:
+    """Print plan/observe text as it streams in"""
+
+    LABELS = {"plan": "🔠 PLAN: ", "observe": "👁️ OBSERVE: "}
+
+    def __init__(self):
+        self.parser = None
+        self.printed = False
+
+    def __call__(self, key, fragment):
+        step = self.parser.fields.get("step") if self.parser else None
+        if step not in self.LABELS:
+            return
+        if not self.printed:
+            sys.stdout.write("\n" + self.LABELS[step])
+            self.printed = True
+        sys.stdout.write(fragment)
+        sys.stdout.flush()
+
+    def end(self):
+        if self.printed:
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+
+
+def stream_step(on_retry=None, echo=True, **request):
+    """Stream a completion and return as soon as the step can be acted on.
+
+    Returns (reply, parsed, timing). `timing` holds the time to first token,
+    the time until the step was dispatchable and whether its text was already
+    printed; with `echo` off nothing is printed. A reply that is not valid
+    JSON goes through json_recovery, which raises json.JSONDecodeError when
+    it cannot be saved.
+    Opening the stream goes through llm_client's retries and circuit breaker;
+    a transient error while reading it raises StreamInterrupted so the
+    caller can request the step again.
+    """
+    printer = StepPrinter()
+    parser = StepStreamParser(on_text=printer if echo else None)
+    printer.parser = parser
+
+    started = time.perf_counter()
+    first_token = None
+    early = False
+    finish_reason = None
+    stream = chat_completion(stream=True, on_retry=on_retry, **request)
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            finish_reason = chunk.choices[0].finish_reason or finish_reason
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first_token is None:
+                first_token = time.perf_counter() - started
+            parser.feed(delta)
+            if parser.is_dispatchable():
+                # Anything after input (metadata, closing brace) is not needed
+                early = not parser.done
+                break
+            if parser.done:
+                break
+    except Exception as e:
+        if not is_retryable(e):
+            raise
+        raise stream_failed(e) from e
+    finally:
+        stream.close()
+        printer.end()
+
+    dispatched = time.perf_counter() - started
+    if early:
+        parsed = dict(parser.fields)
+        reply = json.dumps(parsed)
+        count_recovery("clean")
+    else:
+        reply, parsed = recover_step(parser.text, finish_reason, request)
+
+    timing = {
+        "ttft": first_token if first_token is not None else dispatched,
+        "dispatch": dispatched,
+        "early": early,
+        "streamed": printer.printed,
+    }
+    return reply, parsed, timing
@@ -1,16 +1,55 @@
-from .command_tools import run_command, run_server, stop_servers
+from .command_tools import run_command, read_log, run_server, server_logs, stop_servers, status
 from .file_tools import create_folder, write_file, read_file, list_files, find_files
+from .edit_tools import edit_file, apply_patch, undo, restore
+from .code_search import search_code
 from .system_tools import get_current_directory, check_port
+from .executor import READ_ONLY_TOOLS, execute_actions
+from .workspace import Workspace, use_workspace
+
+# Tool names the model may use, mapped to their implementations
+TOOLS = {
+    "run_command": run_command,
+    "read_log": read_log,
+    "create_folder": create_folder,
+    "write_file": write_file,
+    "edit_file": edit_file,
+    "apply_patch": apply_patch,
+    "undo": undo,
+    "restore": restore,
+    "read_file": read_file,
+    "list_files": list_files,
+    "run_server": run_server,
+    "server_logs": server_logs,
+    "stop_servers": stop_servers,
+    "status": status,
+    "get_current_directory": get_current_directory,
+    "find_files": find_files,
+    "search_code": search_code,
+    "check_port": check_port,
+}
 
 __all__ = [
     'run_command',
+    'read_log',
     'create_folder', 
     'write_file',
+    'edit_file',
+    'apply_patch',
+    'undo',
+    'restore',
     'read_file',
     'list_files',
     'run_server',
+    'server_logs',
     'stop_servers',
+    'status',
     'get_current_directory',
     'find_files',
-    'check_port'
+    'search_code',
+    'check_port',
+    'TOOLS',
+    'READ_ONLY_TOOLS',
+    'execute_actions',
+    'Workspace',
+    'use_workspace'
 ] 
\ No newline at end of file
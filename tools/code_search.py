@@ -0,0 +1,352 @@
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import threading
+
+from .snapshot_store import CODEXLITE_HOME
+from .workspace import resolve
+from .workspace_index import get_index, glob_regex, locate
+
+# Files larger than this are not indexed or searched
+MAX_INDEX_FILE_BYTES = 1024 * 1024
+
+# Bytes sniffed for NUL characters to detect binary files
+BINARY_SNIFF_BYTES = 8192
+
+# Default result budget of one search_code call
+SEARCH_MAX_RESULTS = 50
+SEARCH_MAX_BYTES = 8000
+SEARCH_CONTEXT_LINES = 1
+MAX_RESULT_LINE_CHARS = 300
+
+INDEX_VERSION = 1
+
+# Lines that look like definitions rank their file higher
+_DEFINITION = re.compile(r"^\s*(def|class|function|async function|export|const|let|var|interface|type|struct|fn|func)\b")
+
+
+def _trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+# Characters taken by the argument of a regex escape, after the escape letter
+_ESCAPE_ARGUMENT_LENGTHS = {"x": 2, "u": 4, "U": 8}
+
+def _required_literals(pattern):
+    """Literal runs every match of a regex must contain, or None when none can be derived.
+
+    Only top-level literals are used: groups, classes and escapes break a
+    run, a quantifier drops the character it applies to, and any
+    alternation makes the whole pattern unfilterable.
+    """
+    runs, run = [], ""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            nxt = pattern[i + 1:i + 2]
+            if nxt and not nxt.isalnum() and depth == 0:
+                run += nxt
+                i += 2
+                continue
+            runs.append(run)
+            run = ""
+            i += 2
+            # Skip the argument of \xhh, \uhhhh, \Uhhhhhhhh, \N{name}, octal and backreference escapes
+            if nxt in _ESCAPE_ARGUMENT_LENGTHS:
+                i += _ESCAPE_ARGUMENT_LENGTHS[nxt]
+            elif nxt == "N" and pattern[i:i + 1] == "{":
+                end = pattern.find("}", i)
+                i = len(pattern) if end < 0 else end + 1
+            elif nxt.isdigit():
+                while i < len(pattern) and pattern[i].isdigit():
+                    i += 1
+            continue
+        if c == "[":
+            runs.append(run)
+            run = ""
+            end = pattern.find("]", i + 2)
+            i = len(pattern) if end < 0 else end + 1
+            continue
+        if c == "|":
+            return None
+        if c == "(":
+            depth += 1
+            runs.append(run)
+            run = ""
+        elif c == ")":
+            depth -= 1
+        elif c in "*?{":
+            runs.append(run[:-1])
+            run = ""
+            if c == "{":
+                # Skip the counts of a {m,n} quantifier
+                end = pattern.find("}", i + 1)
+                i = len(pattern) if end < 0 else end + 1
+                continue
+        elif c == "+":
+            runs.append(run)
+            run = ""
+        elif c in ".^$" or depth:
+            runs.append(run)
+            run = ""
+        else:
+            run += c
+        i += 1
+    runs.append(run)
+    return [r for r in runs if len(r) >= 3]
+
+
+def _read_text(path):
+    """File text for indexing and search, or None for binary or oversized files"""
+    try:
+        if os.path.getsize(path) > MAX_INDEX_FILE_BYTES:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if b"\0" in data[:BINARY_SNIFF_BYTES]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+class TrigramIndex:
+    """Persistent trigram index of the text files in a workspace.
+
+    The files come from the workspace index, so ignore rules are shared
+    with find_files. Each file is stored with its mtime and size and the
+    set of lowercased trigrams it contains; a query only reads the files
+    holding every trigram of its required literals. The index is pickled
+    under CODEXLITE_HOME and brought up to date by comparing stat results,
+    or immediately when a tool reports a write.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.files = {}
+        self.postings = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        digest = hashlib.sha1(self.root.encode()).hexdigest()[:16]
+        self.path = os.path.join(CODEXLITE_HOME, "index", f"{digest}.pickle")
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                saved = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if saved.get("version") != INDEX_VERSION or saved.get("root") != self.root:
+            return
+        for rel, (mtime, size, grams) in saved["files"].items():
+            self._add(rel, mtime, size, grams)
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"version": INDEX_VERSION, "root": self.root, "files": self.files}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _add(self, rel, mtime, size, grams):
+        self.files[rel] = (mtime, size, grams)
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(rel)
+
+    def _remove(self, rel):
+        entry = self.files.pop(rel, None)
+        if entry is None:
+            return
+        for gram in entry[2]:
+            holders = self.postings.get(gram)
+            if holders is not None:
+                holders.discard(rel)
+                if not holders:
+                    del self.postings[gram]
+
+    def _update(self, rel, stat=None):
+        path = os.path.join(self.root, rel)
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            self._remove(rel)
+            self.dirty = True
+            return
+        entry = self.files.get(rel)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return
+        self._remove(rel)
+        text = _read_text(path)
+        self._add(rel, stat.st_mtime_ns, stat.st_size, frozenset(_trigrams(text)) if text is not None else frozenset())
+        self.dirty = True
+
+    def refresh(self):
+        """Re-index files whose mtime or size changed and drop deleted ones"""
+        workspace = get_index(self.root)
+        workspace.refresh()
+        with self._lock:
+            current = set(workspace.files())
+            for rel in set(self.files) - current:
+                self._remove(rel)
+                self.dirty = True
+            for rel in current:
+                self._update(rel)
+            self.save()
+
+    def note_changed(self, path):
+        path = resolve(path)
+        rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+        if rel.startswith("../"):
+            return
+        with self._lock:
+            if rel in self.files or os.path.exists(path):
+                self._update(rel)
+
+    def candidates(self, literals):
+        """Files that may match, given literals every match contains"""
+        literals = [literal for literal in literals or [] if len(literal) >= 3]
+        with self._lock:
+            if not literals:
+                return sorted(self.files)
+            result = None
+            for literal in literals:
+                for gram in _trigrams(literal):
+                    holders = self.postings.get(gram, set())
+                    result = set(holders) if result is None else result & holders
+                    if not result:
+                        return []
+            return sorted(result)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_search_index(root="."):
+    """Return the trigram index of a directory, loading it on first use"""
+    root = resolve(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = TrigramIndex(root)
+    return index
+
+def drop_search_indexes(root):
+    """Forget the loaded search indexes of root and of directories under it; their files stay on disk"""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        for key in [k for k in _indexes if k == root or k.startswith(root.rstrip(os.sep) + os.sep)]:
+            del _indexes[key]
+
+def note_file_changed(path):
+    """Update loaded search indexes after a tool wrote or deleted path"""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.note_changed(path)
+
+
+def _clip(line):
+    line = line.rstrip("\r\n")
+    if len(line) <= MAX_RESULT_LINE_CHARS:
+        return line
+    return line[:MAX_RESULT_LINE_CHARS] + "…"
+
+def search_code(data):
+    """Search workspace files by literal text or regex.
+
+    Accepts a query string or {"query", "regex"?, "path"?, "glob"?,
+    "context"?, "max_results"?, "case_sensitive"?}. Matching is
+    case-insensitive unless the query has an uppercase letter. Results are
+    grouped by file, files with more matches and definitions first, and
+    stop at the result and byte budget.
+    """
+    try:
+        options = data if isinstance(data, dict) else {"query": data}
+        query = options.get("query")
+        if not isinstance(query, str) or not query:
+            return "Invalid input: 'query' is required."
+        is_regex = bool(options.get("regex"))
+        case_sensitive = options.get("case_sensitive")
+        if case_sensitive is None:
+            case_sensitive = query != query.lower()
+        context = int(options.get("context", SEARCH_CONTEXT_LINES))
+        max_results = int(options.get("max_results", SEARCH_MAX_RESULTS))
+
+        try:
+            matcher = re.compile(query if is_regex else re.escape(query), 0 if case_sensitive else re.IGNORECASE)
+        except re.error as e:
+            return f"Invalid regex: {e}"
+        literals = _required_literals(query) if is_regex else [query]
+
+        workspace, rel = locate(options.get("path", "."))
+        index = get_search_index(workspace.root)
+        index.refresh()
+        prefix = f"{rel}/" if rel else ""
+        name_filter = glob_regex(options["glob"]) if options.get("glob") else None
+
+        scored = []
+        for path in index.candidates(literals):
+            if not path.startswith(prefix):
+                continue
+            if name_filter and not (name_filter.match(path[len(prefix):]) or name_filter.match(os.path.basename(path))):
+                continue
+            text = _read_text(os.path.join(index.root, path))
+            if text is None:
+                continue
+            lines = text.splitlines()
+            hits = [n for n, line in enumerate(lines) if matcher.search(line)]
+            if not hits:
+                continue
+            score = len(hits) + 3 * sum(1 for n in hits if _DEFINITION.match(lines[n]))
+            if matcher.search(os.path.basename(path)):
+                score += 5
+            scored.append((-score, path, lines, hits))
+        scored.sort(key=lambda item: (item[0], item[1]))
+
+        total = sum(len(item[3]) for item in scored)
+        if not total:
+            return f"No matches for {'regex' if is_regex else 'text'} '{query}'"
+
+        out, size, shown = [], 0, 0
+        for _, path, lines, hits in scored:
+            if shown >= max_results or size >= SEARCH_MAX_BYTES:
+                break
+            block, last = [], -1
+            for n in hits:
+                if shown >= max_results:
+                    break
+                start = max(n - context, last + 1)
+                if block and start > last + 1:
+                    block.append("  --")
+                for k in range(start, min(n + context, len(lines) - 1) + 1):
+                    marker = ":" if matcher.search(lines[k]) else "-"
+                    block.append(f"{path}{marker}{k + 1}{marker} {_clip(lines[k])}")
+                    last = k
+                shown += 1
+            text = "\n".join(block)
+            out.append(text)
+            size += len(text)
+
+        header = f"{total} matches in {len(scored)} files for '{query}'"
+        footer = ""
+        if shown < total:
+            footer = (f"\n… {total - shown} more matches not shown; narrow the query, "
+                      f"or pass path/glob or a larger max_results")
+        return header + ":\n" + "\n".join(out) + footer
+    except Exception as e:
+        return f"Error searching code: {e}"
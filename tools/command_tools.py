@@ -1,22 +1,30 @@
 import subprocess
 import os
+import re
 import signal
+import threading
+import time
 
-# Global variables for process management
+from .shell_session import get_shell, ShellTimeout
+from .output_capture import OutputCapture, new_log_path, rotated_path
+from .system_tools import port_in_use
+from .supervisor import get_supervisor
+from .workspace import current_workspace, getcwd, chdir, resolve
+
+# Servers started by run_server, in start order
 running_processes = []
 
+def _servers():
+    """Servers of the current workspace"""
+    workspace = current_workspace()
+    return workspace.servers if workspace is not None else running_processes
+
+# Exited servers kept around for server_logs
+EXITED_SERVERS_KEPT = 10
+
 def run_command(cmd, timeout=60):
-    """Run command with timeout to prevent hanging"""
+    """Run command in the persistent shell with timeout to prevent hanging"""
     try:
-        # Handle cd commands specially
-        if cmd.strip().startswith('cd '):
-            path = cmd.strip()[3:].strip()
-            try:
-                os.chdir(path)
-                return f"Changed directory to: {os.getcwd()}"
-            except Exception as e:
-                return f"Failed to change directory: {e}"
-        
         # Check for server commands that should use run_server instead
         server_commands = ['npm start', 'npm run dev', 'yarn start', 'yarn dev', 
                           'flask run', 'python -m flask run', 'python app.py',
@@ -25,48 +33,225 @@ def run_command(cmd, timeout=60):
         if any(server_cmd in cmd.lower() for server_cmd in server_commands):
             return f"⚠️ This looks like a server command. Use 'run_server' tool instead of 'run_command' for: {cmd}"
         
-        result = subprocess.run(
-            cmd, 
-            shell=True, 
-            capture_output=True, 
-            text=True, 
-            timeout=timeout,
-            cwd=os.getcwd()
-        )
-        return result.stdout + result.stderr
-    except subprocess.TimeoutExpired:
-        return f"Command timed out after {timeout} seconds: {cmd}"
+        shell = get_shell()
+        capture = OutputCapture()
+        started = time.perf_counter()
+        try:
+            _, exit_code = shell.run(cmd, timeout=timeout, on_line=capture.write)
+        except ShellTimeout as e:
+            capture.close()
+            outcome = "the shell was restarted" if e.restarted else "its processes were killed"
+            return (f"Command timed out after {timeout} seconds and {outcome}: {cmd}\n"
+                    f"{capture.render()}")
+        duration = time.perf_counter() - started
+        capture.close()
+
+        # Keep file tools in step with the shell's working directory
+        if shell.cwd != getcwd() and os.path.isdir(shell.cwd):
+            chdir(shell.cwd)
+            if capture.total_lines == 0 and exit_code == 0:
+                return f"Changed directory to: {shell.cwd}"
+
+        output = capture.render()
+        if output and not output.endswith("\n"):
+            output += "\n"
+        return f"{output}[exit code {exit_code} | {duration:.2f}s]"
     except Exception as e:
         return f"Command failed: {e}"
 
-def run_server(cmd):
-    """Start server in background with process tracking"""
+def read_log(data):
+    """Page through a full command log: {"path", "start": first line (1-based), "lines"}.
+
+    A rotated server log is read from its older half onwards.
+    """
     try:
-        process = subprocess.Popen(
+        if isinstance(data, str):
+            data = {"path": data}
+        path = data.get("path")
+        start = max(int(data.get("start", 1)), 1)
+        count = min(int(data.get("lines", 200)), 1000)
+        if not path:
+            return "Invalid input: 'path' is required."
+
+        path = resolve(path)
+        parts = [p for p in (rotated_path(path), path) if os.path.exists(p)] or [path]
+        shown = []
+        total = 0
+        for part in parts:
+            with open(part, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    total += 1
+                    if start <= total < start + count:
+                        shown.append(f"{total}: {line}")
+        end = min(start + count - 1, total)
+        header = f"Log {path} (lines {start}-{end} of {total}):\n"
+        return header + "".join(shown)
+    except Exception as e:
+        return f"Error reading log: {e}"
+
+# Seconds run_server waits for a server to become ready
+SERVER_READY_TIMEOUT = 30
+
+# Output of a running server kept on disk; older lines are rotated out
+SERVER_LOG_MAX_BYTES = 8 * 1024 * 1024
+
+# Log lines that usually mean a dev server is up
+DEFAULT_READY_PATTERN = (r"(listening|running on|ready|started|compiled successfully|"
+                         r"serving|server is up|https?://(localhost|127\.0\.0\.1|0\.0\.0\.0))")
+
+_PORT_PATTERN = re.compile(r"(?:--port[= ]|-p\s+|PORT=|localhost:|127\.0\.0\.1:)(\d{2,5})\b")
+
+
+class ServerProcess:
+    """A background server whose output is drained into a bounded log"""
+
+    def __init__(self, cmd, managed, ready_pattern=None):
+        self.cmd = cmd
+        self.managed = managed
+        self.process = managed.process
+        self.capture = OutputCapture(new_log_path("server"), max_log_bytes=SERVER_LOG_MAX_BYTES)
+        self.ready_pattern = re.compile(ready_pattern, re.IGNORECASE) if ready_pattern else None
+        self.ready_line = None
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._drain, daemon=True).start()
+
+    def _drain(self):
+        for line in iter(self.process.stdout.readline, ""):
+            with self._lock:
+                self.capture.write(line)
+            if self.ready_pattern and not self.ready.is_set() and self.ready_pattern.search(line):
+                self.ready_line = line.strip()
+                self.ready.set()
+        with self._lock:
+            self.capture.close()
+
+    def recent_lines(self, count=20):
+        with self._lock:
+            head = list(self.capture.head)
+            tail = list(self.capture.tail)
+            elided = self.capture.elided_lines
+        if not elided:
+            return "".join((head + tail)[-count:])
+        # The head and tail are not contiguous once lines have been elided
+        return f"… [earlier output in {self.capture.log_path}] …\n" + "".join(tail[-count:])
+
+    def status(self):
+        code = self.process.poll()
+        return "running" if code is None else f"exited with code {code}"
+
+    def wait_ready(self, port=None, timeout=SERVER_READY_TIMEOUT):
+        """Wait for the port to accept connections or the ready pattern to appear.
+
+        Returns (state, detail) where state is "ready", "failed" or "timeout".
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                return "failed", f"process {self.status()}"
+            if port and port_in_use(port):
+                return "ready", f"port {port} is accepting connections"
+            if self.ready.wait(0.2):
+                return "ready", f"log matched: {self.ready_line}"
+        return "timeout", f"not ready after {timeout}s, still {self.status()}"
+
+
+def run_server(data):
+    """Start server in background and wait until it is ready or has failed.
+
+    Accepts a command string or {"command", "port", "ready_pattern", "timeout"}.
+    """
+    try:
+        if isinstance(data, dict):
+            cmd = data.get("command") or data.get("cmd")
+            port = data.get("port")
+            ready_pattern = data.get("ready_pattern")
+            timeout = float(data.get("timeout", SERVER_READY_TIMEOUT))
+        else:
+            cmd, port, ready_pattern, timeout = data, None, None, SERVER_READY_TIMEOUT
+        if not cmd:
+            return "Invalid input: 'command' is required."
+        if port is None:
+            match = _PORT_PATTERN.search(cmd)
+            port = int(match.group(1)) if match else None
+        if port is None and ready_pattern is None:
+            ready_pattern = DEFAULT_READY_PATTERN
+
+        managed = get_supervisor().spawn(
             cmd, 
+            kind="server",
             shell=True,
+            stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            bufsize=1,
+            cwd=getcwd()
         )
-        running_processes.append(process)
-        return f"Server started (PID: {process.pid}): {cmd}"
+        process = managed.process
+        server = ServerProcess(cmd, managed, ready_pattern)
+        _forget_exited_servers()
+        _servers().append(server)
+
+        started = time.perf_counter()
+        state, detail = server.wait_ready(port=port, timeout=timeout)
+        elapsed = time.perf_counter() - started
+        recent = server.recent_lines()
+
+        if state == "ready":
+            header = f"Server ready after {elapsed:.1f}s (PID: {process.pid}, {detail}): {cmd}"
+        elif state == "failed":
+            header = f"Server failed to start (PID: {process.pid}, {detail}): {cmd}"
+        else:
+            header = f"Server started but {detail} (PID: {process.pid}): {cmd}"
+        return header + (f"\nRecent output:\n{recent}" if recent else "")
     except Exception as e:
         return f"Error starting server: {e}"
 
+def server_logs(data=None):
+    """Show recent output of running servers: optional PID or {"pid", "lines"}"""
+    try:
+        pid, count = None, 50
+        if isinstance(data, dict):
+            pid = data.get("pid")
+            count = int(data.get("lines", count))
+        elif data not in (None, ""):
+            pid = data
+        servers = [s for s in _servers() if pid is None or s.process.pid == int(pid)]
+        if not servers:
+            return f"No server with PID {pid}" if pid is not None else "No servers have been started"
+        sections = []
+        for server in servers:
+            sections.append(f"PID {server.process.pid} ({server.status()}): {server.cmd}\n"
+                            f"{server.recent_lines(count)}")
+        return "\n\n".join(sections)
+    except Exception as e:
+        return f"Error reading server logs: {e}"
+
+def _forget_exited_servers():
+    """Keep every running server but only the most recent exited ones"""
+    servers = _servers()
+    exited = [s for s in servers if s.process.poll() is not None]
+    for server in exited[:-EXITED_SERVERS_KEPT]:
+        servers.remove(server)
+
 def stop_servers():
-    """Stop all running servers"""
+    """Stop all running servers and everything they started"""
+    supervisor = get_supervisor()
+    servers = _servers()
     stopped = 0
-    for process in running_processes:
-        try:
-            process.terminate()
-            process.wait(timeout=5)
+    for server in servers:
+        if server.process.poll() is None:
+            supervisor.kill_tree(server.managed)
             stopped += 1
-        except:
-            try:
-                process.kill()
-                stopped += 1
-            except:
-                pass
-    running_processes.clear()
-    return f"Stopped {stopped} running processes" 
\ No newline at end of file
+    servers.clear()
+    return f"Stopped {stopped} running processes"
+
+def status():
+    """Show running and recent processes with CPU time and peak memory"""
+    try:
+        # The interactive session sees every process; a workspace only its own
+        return get_supervisor().status(current_workspace())
+    except Exception as e:
+        return f"Error reading process status: {e}"
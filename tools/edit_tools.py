@@ -0,0 +1,272 @@
+import os
+import re
+
+from .code_search import note_file_changed
+from .file_tools import atomic_write
+from .snapshot_store import get_snapshot_store, snapshot_write
+from .workspace import resolve
+
+# How far from its stated position a patch hunk may be found
+HUNK_SEARCH_WINDOW = 200
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    """Raised when an edit does not match the current file content"""
+
+
+def _read_text(path):
+    with open(path, "rb") as f:
+        return f.read().decode("utf-8")
+
+def _savings(sent, content):
+    full = len(content.encode("utf-8"))
+    saved = f", {100 * (1 - sent / full):.0f}% saved" if full and sent < full else ""
+    return f"sent {sent} bytes instead of {full} for a full rewrite{saved}"
+
+
+def _apply_edits(content, edits):
+    """Apply search/replace edits in order; all must match or none are applied"""
+    for number, edit in enumerate(edits, 1):
+        search = edit.get("search")
+        replace = edit.get("replace")
+        if not isinstance(search, str) or not isinstance(replace, str) or not search:
+            raise PatchError(f"edit {number}: 'search' and 'replace' strings are required")
+        count = content.count(search)
+        if count == 0:
+            first_line = search.strip().splitlines()[0] if search.strip() else search
+            hint = " (its first line does appear; check whitespace)" if first_line and first_line in content else ""
+            raise PatchError(f"edit {number}: search text not found{hint}")
+        if count > 1 and not edit.get("all"):
+            raise PatchError(f"edit {number}: search text matches {count} times; "
+                             f"add surrounding lines to make it unique or set \"all\": true")
+        content = content.replace(search, replace) if edit.get("all") else content.replace(search, replace, 1)
+    return content
+
+def edit_file(data):
+    """Apply search/replace edits to a file.
+
+    Accepts {"path", "edits": [{"search", "replace", "all"?}]} or a single
+    {"path", "search", "replace"}. Every search text must match the current
+    content (exactly once unless "all" is set) or the file is left untouched.
+    """
+    try:
+        if not isinstance(data, dict) or not data.get("path"):
+            return "Input must be a dictionary with 'path' and 'edits'."
+        path = data["path"]
+        edits = data.get("edits")
+        if edits is None and "search" in data:
+            edits = [{"search": data.get("search"), "replace": data.get("replace"), "all": data.get("all")}]
+        if not isinstance(edits, list) or not edits:
+            return "Invalid input: 'edits' must be a non-empty list of {search, replace}."
+        full = resolve(path)
+        if not os.path.exists(full):
+            return f"Error editing file: {path} does not exist (use write_file to create it)"
+
+        original = _read_text(full)
+        updated = _apply_edits(original, edits)
+        if updated == original:
+            return f"No changes: edits leave {full} unchanged"
+        snapshot_write(full, updated, "edit_file")
+        atomic_write(full, updated)
+        note_file_changed(full)
+
+        sent = sum(len((e.get("search") or "").encode("utf-8")) + len((e.get("replace") or "").encode("utf-8"))
+                   for e in edits)
+        return f"File edited ({len(edits)} edits): {full} ({_savings(sent, updated)})"
+    except PatchError as e:
+        return f"Edit rejected, file unchanged: {e}"
+    except Exception as e:
+        return f"Error editing file: {e}"
+
+
+def _parse_patch(patch):
+    """Split a unified diff into [{"old", "new", "hunks"}].
+
+    Hunk line counts in the @@ headers are not trusted; a hunk runs until
+    the next hunk or file header.
+    """
+    files = []
+    current = None
+    hunk = None
+    lines = patch.splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            current = {"old": _patch_path(line[4:]), "new": None, "hunks": []}
+            files.append(current)
+            hunk = None
+        elif line.startswith("+++ ") and current is not None and current["new"] is None and hunk is None:
+            current["new"] = _patch_path(line[4:])
+        elif line.startswith("@@"):
+            match = _HUNK_HEADER.match(line)
+            if not match or current is None:
+                raise PatchError(f"malformed hunk header: {line}")
+            hunk = {"start": int(match.group(1)), "old": [], "new": []}
+            current["hunks"].append(hunk)
+        elif hunk is None or line.startswith("\\"):
+            continue    # preamble such as "diff --git"/"index", or "\ No newline at end of file"
+        elif line[:1] in (" ", ""):
+            hunk["old"].append(line[1:])
+            hunk["new"].append(line[1:])
+        elif line[0] == "-":
+            hunk["old"].append(line[1:])
+        elif line[0] == "+":
+            hunk["new"].append(line[1:])
+        else:
+            hunk = None
+    if not files:
+        raise PatchError("no file headers (--- / +++) found in patch")
+    for entry in files:
+        for hunk in entry["hunks"]:
+            # Blank lines trailing a hunk are usually separators, not context
+            while hunk["old"] and hunk["new"] and hunk["old"][-1] == "" and hunk["new"][-1] == "":
+                hunk["old"].pop()
+                hunk["new"].pop()
+    return files
+
+def _patch_path(header):
+    path = header.split("\t")[0].strip()
+    if path == "/dev/null":
+        return None
+    if path[:2] in ("a/", "b/"):
+        path = path[2:]
+    return path
+
+def _apply_hunks(lines, hunks):
+    """Apply hunks to a list of lines (without line endings)"""
+    offset = 0
+    for number, hunk in enumerate(hunks, 1):
+        old = hunk["old"]
+        expected = max(hunk["start"] - 1 + offset, 0) if old else hunk["start"] + offset
+        position = None
+        for distance in range(HUNK_SEARCH_WINDOW + 1):
+            for candidate in (expected - distance, expected + distance):
+                if 0 <= candidate <= len(lines) - len(old) and lines[candidate:candidate + len(old)] == old:
+                    position = candidate
+                    break
+            if position is not None:
+                break
+        if position is None:
+            context = old[0] if old else ""
+            raise PatchError(f"hunk {number} (line {hunk['start']}) does not match the file; "
+                             f"expected to find: {context!r}")
+        lines[position:position + len(old)] = hunk["new"]
+        offset += len(hunk["new"]) - len(old)
+    return lines
+
+def apply_patch(data):
+    """Apply a unified diff to one or more files.
+
+    Accepts the diff text or {"patch", "path"?}. `path` overrides the file
+    name in the diff headers. All hunks are validated against the current
+    content before anything is written.
+    """
+    try:
+        if isinstance(data, dict):
+            patch, override = data.get("patch"), data.get("path")
+        else:
+            patch, override = data, None
+        if not isinstance(patch, str) or not patch.strip():
+            return "Invalid input: 'patch' must be a unified diff."
+
+        files = _parse_patch(patch)
+        if override and len(files) == 1:
+            files[0]["new"] = files[0]["new"] and override
+            files[0]["old"] = files[0]["old"] and override
+
+        # Validate every file before writing any of them
+        planned = []
+        for entry in files:
+            target = resolve(entry["new"] or entry["old"])
+            if any(target == seen for seen, _ in planned):
+                raise PatchError(f"{entry['new'] or entry['old']} appears more than once in the patch")
+            if entry["new"] is None:
+                if not os.path.isfile(target):
+                    raise PatchError(f"{entry['old']} cannot be deleted: it does not exist")
+                planned.append((target, None))
+                continue
+            if entry["old"] is None:
+                original = ""
+            else:
+                if not os.path.exists(resolve(entry["old"])):
+                    raise PatchError(f"{entry['old']} does not exist")
+                original = _read_text(resolve(entry["old"]))
+            newline = "\r\n" if "\r\n" in original else "\n"
+            lines = original.splitlines()
+            trailing = original.endswith(("\n", "\r")) or not original
+            updated = newline.join(_apply_hunks(lines, entry["hunks"]))
+            if trailing and updated:
+                updated += newline
+            planned.append((target, updated))
+
+        reports = []
+        written = ""
+        for target, content in planned:
+            snapshot_write(target, content, "apply_patch")
+            if content is None:
+                os.remove(target)
+                reports.append(f"Deleted: {target}")
+            else:
+                atomic_write(target, content)
+                written += content
+                reports.append(f"Patched: {target}")
+            note_file_changed(target)
+        if written:
+            reports.append(f"Applied patch to {len(planned)} file(s) ({_savings(len(patch.encode('utf-8')), written)})")
+        return "\n".join(reports)
+    except PatchError as e:
+        return f"Patch rejected, no files changed: {e}"
+    except Exception as e:
+        return f"Error applying patch: {e}"
+
+
+def undo(data=None):
+    """Revert the most recent file changes made this session.
+
+    Accepts nothing (one change), a number of steps, or {"steps"}. Only the
+    files those changes touched are rewritten; an undo can itself be
+    reverted with restore.
+    """
+    try:
+        steps = data.get("steps", 1) if isinstance(data, dict) else (data or 1)
+        steps = int(steps)
+        if steps < 1:
+            return "Invalid input: 'steps' must be at least 1."
+        reverted = get_snapshot_store().undo(steps)
+        if not reverted:
+            return "Nothing to undo: no file changes recorded this session"
+        lines = []
+        for entry in reverted:
+            note_file_changed(entry["path"])
+            action = "deleted" if entry["before"] is None else "restored"
+            lines.append(f"{action} {entry['path']} (undid #{entry['seq']} {entry['tool']})")
+        return "Undone:\n" + "\n".join(lines)
+    except Exception as e:
+        return f"Error undoing changes: {e}"
+
+def restore(data):
+    """Restore a file to an earlier snapshot.
+
+    Accepts a path or {"path", "seq"?}. Without `seq` the file returns to
+    its content before this session first changed it; with `seq` to its
+    content before that change. A path with no changes lists nothing to do.
+    """
+    try:
+        path, seq = (data.get("path"), data.get("seq")) if isinstance(data, dict) else (data, None)
+        if not path:
+            return "Input must be a path or a dictionary with 'path' and optional 'seq'."
+        store = get_snapshot_store()
+        restored = store.restore(path, seq)
+        if restored is None:
+            history = store.versions(path)
+            if not history:
+                return f"No snapshots of {resolve(path)} this session"
+            changes = ", ".join(f"#{e['seq']} {e['tool']}" for e in history)
+            return f"No change #{seq} for {resolve(path)}; recorded changes: {changes}"
+        entry, target = restored
+        note_file_changed(entry["path"])
+        state = "removed (it did not exist yet)" if target["before"] is None else "restored"
+        return f"File {state}: {entry['path']} (state before #{target['seq']} {target['tool']})"
+    except Exception as e:
+        return f"Error restoring file: {e}"
@@ -0,0 +1,95 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from .tracing import span
+from .workspace import current_workspace, resolve
+
+# Tools that never change the workspace and can safely run side by side
+READ_ONLY_TOOLS = {
+    "read_file", "read_log", "list_files", "find_files", "search_code", "check_port", "get_current_directory",
+    "server_logs", "status",
+}
+
+# Tools that take no input
+NO_INPUT_TOOLS = {"get_current_directory", "stop_servers", "status"}
+
+# Tools whose results record the absolute path they read or wrote
+FILE_TOOLS = {"read_file", "write_file"}
+
+MAX_WORKERS = 8
+
+# Tool threads of each workspace, so one session's batch cannot starve another's
+WORKSPACE_MAX_WORKERS = 4
+
+_pool = None
+
+def _get_pool():
+    global _pool
+    workspace = current_workspace()
+    if workspace is not None:
+        if workspace.pool is None:
+            workspace.pool = ThreadPoolExecutor(max_workers=WORKSPACE_MAX_WORKERS,
+                                                thread_name_prefix=f"tool-{workspace.name}")
+        return workspace.pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="tool")
+    return _pool
+
+def run_tool(tools, tool_name, tool_input):
+    """Run a single tool and return its output, traced as a "tool" span"""
+    with span(tool_name, "tool") as attrs:
+        try:
+            if tool_name in NO_INPUT_TOOLS:
+                output = tools[tool_name]()
+            else:
+                output = tools[tool_name](tool_input)
+        except Exception as e:
+            output = f"Error running {tool_name}: {e}"
+        attrs["output_bytes"] = len(str(output).encode("utf-8"))
+        return output
+
+def _file_path(action):
+    """Absolute path of a file tool's input, resolved in the current workspace, or None"""
+    if action.get("tool") not in FILE_TOOLS:
+        return None
+    tool_input = action.get("input")
+    path = tool_input.get("path") if isinstance(tool_input, dict) else tool_input
+    return resolve(path) if isinstance(path, str) else None
+
+def plan_waves(actions):
+    """Group actions into waves that may run concurrently.
+
+    Consecutive read-only actions share a wave. A mutating action gets a
+    wave of its own, so it starts only after everything before it has
+    finished and everything after it waits for it.
+    """
+    waves = []
+    for action in actions:
+        if action.get("tool") in READ_ONLY_TOOLS and waves and waves[-1][0].get("tool") in READ_ONLY_TOOLS:
+            waves[-1].append(action)
+        else:
+            waves.append([action])
+    return waves
+
+def execute_actions(actions, tools, on_result=None):
+    """Run a batch of actions and return their results in the original order"""
+    results = []
+    for wave in plan_waves(actions):
+        # Resolved before the wave runs, against the directory the tools see
+        paths = [_file_path(action) for action in wave]
+        if len(wave) == 1:
+            outputs = [run_tool(tools, wave[0].get("tool"), wave[0].get("input"))]
+        else:
+            pool = _get_pool()
+            # Each action runs in a copy of the caller's context, so it sees the same workspace
+            futures = [pool.submit(contextvars.copy_context().run, run_tool, tools, a.get("tool"), a.get("input"))
+                       for a in wave]
+            outputs = [f.result() for f in futures]
+        for action, path, output in zip(wave, paths, outputs):
+            result = {"tool": action.get("tool"), "input": action.get("input"), "output": output}
+            if path is not None:
+                result["path"] = path
+            if on_result:
+                on_result(result)
+            results.append(result)
+    return results
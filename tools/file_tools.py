@@ -1,17 +1,38 @@
 import os
 import glob
+import bisect
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
 from pathlib import Path
 
+from .code_search import note_file_changed
+from .snapshot_store import snapshot_write, write_atomic_bytes
+from .workspace import resolve
+from .workspace_index import locate
+
 def create_folder(path):
     """Create folder with better error handling"""
     try:
-        Path(path).mkdir(parents=True, exist_ok=True)
-        return f"Folder created: {os.path.abspath(path)}"
+        full = resolve(path)
+        Path(full).mkdir(parents=True, exist_ok=True)
+        return f"Folder created: {full}"
     except Exception as e:
         return f"Error creating folder: {e}"
 
+def atomic_write(path, content):
+    """Write text to path through a temp file and os.replace.
+
+    Readers see either the old file or the complete new one, never a
+    partial write. The existing file's permissions are kept.
+    """
+    path = resolve(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic_bytes(path, content.encode("utf-8"), sync=True)
+
 def write_file(data):
-    """Write file with backup and validation"""
+    """Write file atomically, snapshotting the previous content for undo"""
     try:
         if isinstance(data, dict):
             path = data.get("path")
@@ -19,53 +40,202 @@ def write_file(data):
             if not path or content is None:
                 return "Invalid input: 'path' and 'content' are required."
             
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(path), exist_ok=True)
-            
-            # Backup existing file if it exists
-            if os.path.exists(path):
-                backup_path = f"{path}.backup"
-                os.rename(path, backup_path)
-            
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(content)
-            return f"File written: {os.path.abspath(path)}"
+            snapshot_write(path, content, "write_file")
+            atomic_write(path, content)
+            note_file_changed(path)
+            return f"File written: {resolve(path)}"
         else:
             return "Input must be a dictionary with 'path' and 'content'."
     except Exception as e:
         return f"Error writing file: {e}"
 
-def read_file(path):
-    """Read file contents"""
+# Default cap on the bytes of file content returned by one read_file call
+READ_MAX_BYTES = 50000
+
+# Files at least this large are served through mmap and a line index
+MMAP_THRESHOLD = 256 * 1024
+
+# Bytes sniffed for NUL characters to detect binary files
+BINARY_SNIFF_BYTES = 8192
+
+# Line-offset indexes kept, keyed by (path, mtime, size)
+LINE_INDEX_CACHE_SIZE = 16
+
+_line_indexes = OrderedDict()
+_line_indexes_lock = threading.Lock()
+
+def _line_index(path, stat, mapped):
+    """Offsets of every line start, built once per (path, mtime, size)"""
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _line_indexes_lock:
+        index = _line_indexes.get(key)
+        if index is not None:
+            _line_indexes.move_to_end(key)
+            return index
+    # Built outside the lock; concurrent readers of one new file may both build it
+    index = array("Q", [0])
+    find = mapped.find
+    pos = find(b"\n")
+    while pos != -1:
+        index.append(pos + 1)
+        pos = find(b"\n", pos + 1)
+    if index[-1] == stat.st_size and stat.st_size:
+        index.pop()     # a trailing newline does not start another line
+    with _line_indexes_lock:
+        _line_indexes[key] = index
+        while len(_line_indexes) > LINE_INDEX_CACHE_SIZE:
+            _line_indexes.popitem(last=False)
+    return index
+
+def _read_options(data):
+    if isinstance(data, dict):
+        return (data.get("path"), data.get("start_line"), data.get("end_line"),
+                data.get("offset"), int(data.get("max_bytes") or READ_MAX_BYTES))
+    return data, None, None, None, READ_MAX_BYTES
+
+def read_file(data):
+    """Read file contents, optionally a line range or byte offset.
+
+    Accepts a path or {"path", "start_line", "end_line", "offset", "max_bytes"}.
+    At most `max_bytes` of content is returned; large files are served
+    through mmap so only the requested window is touched.
+    """
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            content = f.read()
-        return f"File content ({path}):\n{content}"
+        path, start_line, end_line, offset, max_bytes = _read_options(data)
+        if not path:
+            return "Invalid input: 'path' is required."
+        full = resolve(path)
+        stat = os.stat(full)
+        size = stat.st_size
+
+        with open(full, "rb") as f:
+            if b"\0" in f.read(BINARY_SNIFF_BYTES):
+                return f"Binary file ({path}, {size} bytes): contents not shown"
+            if size == 0:
+                return f"File content ({path}):\n"
+
+            ranged = start_line is not None or end_line is not None or offset is not None
+            if not ranged and size <= min(max_bytes, MMAP_THRESHOLD):
+                f.seek(0)
+                content = f.read().decode("utf-8", errors="replace")
+                return f"File content ({path}):\n{content}"
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if offset is not None:
+                    start = min(max(int(offset), 0), size)
+                    end = min(start + max_bytes, size)
+                    content = mapped[start:end].decode("utf-8", errors="replace")
+                    header = f"File content ({path}, bytes {start}-{end} of {size}):\n"
+                    footer = f"\n[... {size - end} more bytes; read with offset={end} to continue]" if end < size else ""
+                    return header + content + footer
+
+                index = _line_index(full, stat, mapped)
+                total = len(index)
+                first = min(max(int(start_line or 1), 1), total)
+                last = min(int(end_line or total), total)
+                if last < first:
+                    return f"Invalid range: lines {first}-{last} of {total} in {path}"
+
+                start = index[first - 1]
+                # Stop at the last whole line that fits in the byte budget
+                limit = start + max_bytes
+                shown = last
+                clipped = False
+                end = index[last] if last < total else size
+                if end > limit:
+                    shown = max(bisect.bisect_right(index, limit, first - 1, last) - 1, first)
+                    end = index[shown] if shown < total else size
+                    if shown == first and end > limit:
+                        end = limit
+                        clipped = True
+                content = mapped[start:end].decode("utf-8", errors="replace")
+
+        header = f"File content ({path}, lines {first}-{shown} of {total}):\n"
+        footer = ""
+        if clipped:
+            footer = f"\n[... line {first} clipped at {max_bytes} bytes; read with offset={end} to continue]"
+        elif shown < total:
+            footer = f"\n[... {total - shown} more lines; read with start_line={shown + 1} to continue]"
+        return header + content + footer
     except Exception as e:
         return f"Error reading file: {e}"
 
-def list_files(path="."):
-    """List files and directories with details"""
+# Entries returned by one list_files or find_files call
+LIST_MAX_ENTRIES = 200
+FIND_MAX_RESULTS = 200
+
+def _page_args(data, key, default):
+    """Split tool input into (value, offset, limit) for paginated tools"""
+    if isinstance(data, dict):
+        return data.get(key, default), int(data.get("offset", 0)), data.get("limit")
+    return (data or default), 0, None
+
+def _page_footer(shown_end, total, noun):
+    if shown_end >= total:
+        return ""
+    return f"\n... {total - shown_end} more {noun}; pass offset={shown_end} to see them"
+
+def list_files(data="."):
+    """List a directory, hiding ignored entries; accepts a path or {path, offset, limit}"""
     try:
+        path, offset, limit = _page_args(data, "path", ".")
+        limit = int(limit or LIST_MAX_ENTRIES)
+        full = resolve(path)
+        if not os.path.isdir(full):
+            return f"Error listing files: {path} is not a directory"
+
+        index, rel = locate(full)
+        listing = index.listing(rel)
+        names = os.listdir(full)
+        if listing is None:
+            # An ignored directory listed explicitly: show it as is
+            files = sorted(n for n in names if not os.path.isdir(os.path.join(full, n)))
+            subdirs = sorted(n for n in names if os.path.isdir(os.path.join(full, n)))
+        else:
+            files, subdirs = listing
+        hidden = sorted(set(names) - set(files) - set(subdirs))
+
+        entries = [(name, True) for name in subdirs] + [(name, False) for name in files]
         items = []
-        for item in os.listdir(path):
-            item_path = os.path.join(path, item)
-            if os.path.isdir(item_path):
-                items.append(f"📁 {item}/")
+        for name, is_dir in entries[offset:offset + limit]:
+            if is_dir:
+                items.append(f"📁 {name}/")
             else:
-                size = os.path.getsize(item_path)
-                items.append(f"📄 {item} ({size} bytes)")
-        return f"Contents of {os.path.abspath(path)}:\n" + "\n".join(items)
+                size = os.path.getsize(os.path.join(full, name))
+                items.append(f"📄 {name} ({size} bytes)")
+        text = f"Contents of {full}:\n" + "\n".join(items)
+        text += _page_footer(offset + len(items), len(entries), "entries")
+        if hidden:
+            shown = ", ".join(hidden[:10]) + (", ..." if len(hidden) > 10 else "")
+            text += f"\n({len(hidden)} ignored: {shown})"
+        return text
     except Exception as e:
         return f"Error listing files: {e}"
 
-def find_files(pattern, path="."):
-    """Find files matching pattern"""
+def find_files(data, path="."):
+    """Find indexed files matching a glob; accepts a pattern or {pattern, path, offset, limit}"""
     try:
-        matches = glob.glob(os.path.join(path, pattern), recursive=True)
-        if matches:
-            return f"Found files matching '{pattern}':\n" + "\n".join(matches)
-        else:
-            return f"No files found matching '{pattern}'"
+        pattern, offset, limit = _page_args(data, "pattern", "")
+        if isinstance(data, dict):
+            path = data.get("path", path)
+        limit = int(limit or FIND_MAX_RESULTS)
+        if not pattern:
+            return "Invalid input: 'pattern' is required."
+
+        full = resolve(path)
+        index, rel = locate(full)
+        prefix = f"{rel}/" if rel else ""
+        matches = [m[len(prefix):] for m in index.glob(prefix + pattern)]
+        literal = pattern.split("*")[0].split("?")[0].split("[")[0]
+        if not matches and os.path.isdir(os.path.join(full, os.path.dirname(literal) or "\0")):
+            # The pattern names a directory outright, possibly an ignored one
+            matches = sorted(os.path.relpath(m, full) for m in glob.iglob(os.path.join(full, pattern), recursive=True))
+        if not matches:
+            return f"No files found matching '{pattern}' (ignored directories such as node_modules are skipped)"
+        page = matches[offset:offset + limit]
+        header = f"Found {len(matches)} files matching '{pattern}'"
+        if len(page) < len(matches):
+            header += f" (showing {offset + 1}-{offset + len(page)})"
+        return header + ":\n" + "\n".join(page) + _page_footer(offset + len(page), len(matches), "matches")
     except Exception as e:
-        return f"Error finding files: {e}" 
\ No newline at end of file
+        return f"Error finding files: {e}"
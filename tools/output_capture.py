@@ -0,0 +1,144 @@
+import os
+import atexit
+import shutil
+import tempfile
+import threading
+from collections import deque
+
+from .workspace import current_workspace
+
+# What a command may put into the conversation, from its start and its end
+HEAD_LINES = 40
+HEAD_BYTES = 4000
+TAIL_LINES = 80
+TAIL_BYTES = 8000
+
+# Longest single line kept in the head or tail
+MAX_LINE_CHARS = 500
+
+_log_dir = None
+_log_counter = 0
+_log_lock = threading.Lock()
+
+def new_log_path(prefix="cmd"):
+    """Allocate a file for a full command log.
+
+    Logs live in a directory of this process that is removed at exit; a
+    Workspace gets a subdirectory of its own, removed when it closes.
+    """
+    global _log_dir, _log_counter
+    with _log_lock:
+        if _log_dir is None:
+            _log_dir = tempfile.mkdtemp(prefix="codexlite-logs-")
+            atexit.register(shutil.rmtree, _log_dir, True)
+        directory = _log_dir
+        workspace = current_workspace()
+        if workspace is not None:
+            if workspace.log_dir is None:
+                workspace.log_dir = tempfile.mkdtemp(prefix=f"{workspace.name}-", dir=_log_dir)
+            directory = workspace.log_dir
+        _log_counter += 1
+        return os.path.join(directory, f"{prefix}-{_log_counter:04d}.log")
+
+def rotated_path(log_path):
+    """Where the older half of a rotated log is kept"""
+    return log_path + ".1"
+
+
+def _clip(line, log_path):
+    newline = "\n" if line.endswith("\n") else ""
+    return (f"{line[:MAX_LINE_CHARS]}… [{len(line) - MAX_LINE_CHARS} chars clipped; "
+            f"full line in {log_path}]{newline}")
+
+
+class OutputCapture:
+    """Bounded capture of a command's output.
+
+    The first lines fill a fixed head, later lines pass through a ring buffer
+    that keeps only the tail, and everything is streamed to a log file so
+    the elided middle and clipped long lines can be read later. Once a line
+    has gone to the tail, every later line does too, so output stays in
+    order. With `max_log_bytes` the log is rotated: when the file reaches
+    half the limit it moves to `rotated_path` and a new file starts, so
+    only about the last `max_log_bytes` of output are kept on disk.
+    """
+
+    def __init__(self, log_path=None, head_lines=HEAD_LINES, head_bytes=HEAD_BYTES,
+                 tail_lines=TAIL_LINES, tail_bytes=TAIL_BYTES, max_log_bytes=None):
+        self.log_path = log_path or new_log_path()
+        self._log = open(self.log_path, "w", encoding="utf-8", errors="replace")
+        self.max_log_bytes = max_log_bytes
+        self._log_size = 0
+        self.rotations = 0
+        self.head_lines = head_lines
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = []
+        self.tail = deque(maxlen=tail_lines)
+        self._head_size = 0
+        self._tail_size = 0
+        self.total_lines = 0
+        self.total_bytes = 0
+        self.elided_lines = 0
+        self.elided_bytes = 0
+        self.clipped_lines = 0
+        self._spilled = False
+
+    def write(self, line):
+        if self.max_log_bytes and self._log_size and self._log_size + len(line) > self.max_log_bytes // 2:
+            self._rotate()
+        self._log.write(line)
+        self._log_size += len(line)
+        self.total_lines += 1
+        self.total_bytes += len(line)
+        if len(line) > MAX_LINE_CHARS:
+            line = _clip(line, self.log_path)
+            self.clipped_lines += 1
+
+        if not self._spilled:
+            if len(self.head) < self.head_lines and self._head_size + len(line) <= self.head_bytes:
+                self.head.append(line)
+                self._head_size += len(line)
+                return
+            self._spilled = True
+
+        if len(self.tail) == self.tail.maxlen:
+            self._evict()
+        self.tail.append(line)
+        self._tail_size += len(line)
+        while self._tail_size > self.tail_bytes and len(self.tail) > 1:
+            self._evict()
+
+    def _rotate(self):
+        self._log.close()
+        os.replace(self.log_path, rotated_path(self.log_path))
+        self._log = open(self.log_path, "w", encoding="utf-8", errors="replace")
+        self._log_size = 0
+        self.rotations += 1
+
+    def _evict(self):
+        dropped = self.tail.popleft()
+        self._tail_size -= len(dropped)
+        self.elided_lines += 1
+        self.elided_bytes += len(dropped)
+
+    def close(self):
+        """Close the log, removing it when the capture holds all of the output"""
+        if not self._log.closed:
+            self._log.close()
+            if not self.truncated and not self.clipped_lines and not self.rotations:
+                os.remove(self.log_path)
+
+    @property
+    def truncated(self):
+        return self.elided_lines > 0
+
+    def render(self):
+        """Head and tail of the output with an elision marker between them"""
+        text = "".join(self.head)
+        if self.truncated:
+            if text and not text.endswith("\n"):
+                text += "\n"
+            text += (f"… [{self.elided_lines} lines ({self.elided_bytes} bytes) elided; "
+                     f"full log: {self.log_path} — page through it with read_log] …\n")
+        return text + "".join(self.tail)
@@ -0,0 +1,169 @@
+import atexit
+import os
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+from .supervisor import get_supervisor
+from .workspace import current_workspace
+
+SHELL = os.getenv("CODEXLITE_SHELL", "/bin/bash")
+
+
+def _ansi_c_quote(text):
+    """Quote text as a bash $'...' string so any command is passed through intact"""
+    escaped = (text.replace("\\", "\\\\").replace("'", "\\'")
+               .replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t"))
+    return f"$'{escaped}'"
+
+
+class ShellTimeout(Exception):
+    """Raised when a command does not finish within its timeout"""
+
+    def __init__(self, cmd, restarted=False):
+        super().__init__(cmd)
+        self.restarted = restarted
+
+
+class ShellSession:
+    """A long-lived shell that runs commands one at a time.
+
+    Commands are framed with a per-session sentinel line that carries the
+    exit code and working directory, so `cd`, exported variables and
+    activated virtualenvs persist between calls. When a command hangs past
+    its timeout, the processes it started are killed and the shell is kept;
+    only if the shell itself does not recover is it replaced by a fresh one
+    in the last known directory.
+    """
+
+    def __init__(self, cwd=None):
+        self.cwd = cwd or os.getcwd()
+        self.process = None
+        self.managed = None
+        self._lines = None
+        self._sentinel = f"__CODEXLITE_{uuid.uuid4().hex}__"
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.managed = get_supervisor().spawn(
+            [SHELL, "--noprofile", "--norc"],
+            kind="shell",
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            bufsize=1,
+            cwd=self.cwd,
+        )
+        self.process = self.managed.process
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self.process.stdout, self._lines), daemon=True).start()
+
+    @staticmethod
+    def _read(stream, lines):
+        for line in iter(stream.readline, ""):
+            lines.put(line)
+        lines.put(None)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, cmd, timeout=60, on_line=None):
+        """Run a command and return (output, exit_code).
+
+        With `on_line`, output lines are handed to it as they arrive and the
+        returned output is empty. Raises ShellTimeout if the command runs
+        longer than `timeout` seconds.
+        """
+        output = []
+        emit = on_line or output.append
+        with self._lock:
+            if not self.alive():
+                self.start()
+            script = (f"eval {_ansi_c_quote(cmd)} < /dev/null 2>&1\n"
+                      f"printf '\\n%s %s %s\\n' '{self._sentinel}' \"$?\" \"$PWD\"\n")
+            try:
+                self.process.stdin.write(script)
+                self.process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                self.kill()
+                self.start()
+                self.process.stdin.write(script)
+                self.process.stdin.flush()
+
+            deadline = time.monotonic() + timeout
+            timed_out = False
+            # The line before the sentinel ends with the newline printf adds,
+            # so each line is held back until the next one arrives
+            held = None
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if not timed_out:
+                        # Kill what the command started and give the shell a moment to report back
+                        timed_out = True
+                        get_supervisor().kill_descendants(self.managed)
+                        deadline = time.monotonic() + 2
+                        continue
+                    if held is not None:
+                        emit(held)
+                    self.kill()
+                    raise ShellTimeout(cmd, restarted=True)
+                try:
+                    line = self._lines.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if line is None:
+                    # The command ended the shell itself (e.g. `exit`)
+                    if held is not None:
+                        emit(held)
+                    self.process.wait()
+                    return "".join(output), self.process.returncode
+                if line.startswith(self._sentinel):
+                    _, code, cwd = line.rstrip("\n").split(" ", 2)
+                    self.cwd = cwd
+                    if held is not None and held != "\n":
+                        emit(held[:-1])
+                    if timed_out:
+                        raise ShellTimeout(cmd)
+                    return "".join(output), int(code)
+                if held is not None:
+                    emit(held)
+                held = line
+
+    def kill(self):
+        """Kill the shell and everything it started"""
+        if self.managed is None:
+            return
+        get_supervisor().kill_tree(self.managed, grace=0)
+        self.process = None
+        self.managed = None
+
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.write("exit\n")
+                self.process.stdin.flush()
+                self.process.wait(timeout=2)
+            except Exception:
+                pass
+        self.kill()
+
+
+_session = None
+
+def get_shell():
+    """Return the shell session of the current workspace, shared by its run_command calls"""
+    global _session
+    workspace = current_workspace()
+    if workspace is not None:
+        if workspace.shell is None:
+            workspace.shell = ShellSession(cwd=workspace.cwd)
+        return workspace.shell
+    if _session is None:
+        _session = ShellSession()
+        atexit.register(_session.close)
+    return _session
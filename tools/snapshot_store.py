@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+
+from .workspace import current_workspace, resolve
+
+# Where codexLite keeps its own state, outside the workspace
+CODEXLITE_HOME = os.getenv("CODEXLITE_HOME", os.path.join(os.path.expanduser("~"), ".cache", "codexlite"))
+
+# Eviction policy for snapshots of past sessions
+SNAPSHOT_MAX_BYTES = int(os.getenv("CODEXLITE_SNAPSHOT_MAX_MB", "200")) * 1024 * 1024
+SNAPSHOT_MAX_AGE_DAYS = float(os.getenv("CODEXLITE_SNAPSHOT_MAX_AGE_DAYS", "14"))
+
+# Blobs this recent may belong to a change not journaled yet, here or in
+# another process, so eviction leaves them alone
+GC_GRACE_SECONDS = 600
+
+SESSION_ID = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+# Read once: os.umask can only be queried by setting it, which races with other threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def write_atomic_bytes(path, data, sync=False):
+    """Replace path with data through a temp file, keeping the file's permissions.
+
+    A new file gets the umask default rather than mkstemp's 0600. With
+    `sync` the data is flushed to disk before the rename.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class SnapshotStore:
+    """Deduplicated, compressed snapshots of files the agent changes.
+
+    File contents are stored once per SHA-256 as zlib blobs. Each session
+    appends its writes to a JSONL journal of (path, before, after) hashes,
+    so undoing or restoring touches only the files that changed. Journals
+    of old sessions, and blobs no journal refers to, are evicted by age and
+    total size.
+    """
+
+    # Eviction runs once per process, however many stores are opened
+    _gc_started = False
+
+    def __init__(self, root=None, session_id=SESSION_ID,
+                 max_bytes=SNAPSHOT_MAX_BYTES, max_age_days=SNAPSHOT_MAX_AGE_DAYS):
+        self.root = root or os.path.join(CODEXLITE_HOME, "snapshots")
+        self.session_id = session_id
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.journals_dir = os.path.join(self.root, "journals")
+        self.journal_path = os.path.join(self.journals_dir, f"{session_id}.jsonl")
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put_blob(self, data):
+        """Store bytes once and return their hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        try:
+            # A reused blob counts as new again, so eviction keeps it until it is journaled
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic_bytes(path, zlib.compress(data))
+        return digest
+
+    def get_blob(self, digest):
+        with open(self._blob_path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def record(self, path, before, after, tool, **extra):
+        """Journal a change to path; `before`/`after` are bytes, or None when absent"""
+        if not SnapshotStore._gc_started:
+            SnapshotStore._gc_started = True
+            threading.Thread(target=self.gc, daemon=True).start()
+        entry = {
+            "ts": time.time(),
+            "path": resolve(path),
+            "before": self.put_blob(before) if before is not None else None,
+            "after": self.put_blob(after) if after is not None else None,
+            "tool": tool,
+            **extra,
+        }
+        with self._lock:
+            entry["seq"] = len(self.entries) + 1
+            self.entries.append(entry)
+            os.makedirs(self.journals_dir, exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def read_current(self, path):
+        """Current bytes of path, or None when it does not exist"""
+        try:
+            with open(resolve(path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _set_content(self, path, digest, tool, **extra):
+        """Bring path to the content `digest` (None deletes it), journaling the change"""
+        path = resolve(path)
+        before = self.read_current(path)
+        if digest is None:
+            if before is not None:
+                os.remove(path)
+            after = None
+        else:
+            after = self.get_blob(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic_bytes(path, after, sync=True)
+        return self.record(path, before, after, tool, **extra)
+
+    def undo(self, steps=1):
+        """Revert the last `steps` changes of this session that are not yet undone; returns them"""
+        undone = {e["undoes"] for e in self.entries if e.get("undoes")}
+        targets = [e for e in reversed(self.entries)
+                   if not e.get("undoes") and e["seq"] not in undone][:steps]
+        for entry in targets:
+            self._set_content(entry["path"], entry["before"], "undo", undoes=entry["seq"])
+        return targets
+
+    def versions(self, path):
+        path = resolve(path)
+        return [e for e in self.entries if e["path"] == path]
+
+    def restore(self, path, seq=None):
+        """Restore path to its content before change `seq`, or before its first change this session"""
+        history = self.versions(path)
+        if not history:
+            return None
+        entry = history[0] if seq is None else next((e for e in history if e["seq"] == int(seq)), None)
+        if entry is None:
+            return None
+        return self._set_content(path, entry["before"], "restore"), entry
+
+    def gc(self):
+        """Evict journals past the age limit, then oldest journals until blobs fit the size cap.
+
+        Blobs written within GC_GRACE_SECONDS and in-progress .tmp files are
+        never deleted: their journal entry may not be written yet.
+        """
+        started = time.time()
+        try:
+            if not os.path.isdir(self.journals_dir):
+                return
+            now = time.time()
+            journals = []
+            for name in os.listdir(self.journals_dir):
+                path = os.path.join(self.journals_dir, name)
+                if path == self.journal_path:
+                    continue
+                mtime = os.path.getmtime(path)
+                if now - mtime > self.max_age:
+                    os.remove(path)
+                else:
+                    journals.append((mtime, path))
+            journals.sort()
+
+            while True:
+                referenced = self._referenced_blobs()
+                total = 0
+                for directory, _, files in os.walk(self.objects_dir):
+                    for name in files:
+                        if name.endswith(".tmp"):
+                            continue
+                        blob = os.path.join(directory, name)
+                        digest = os.path.basename(directory) + name
+                        try:
+                            stat = os.stat(blob)
+                            if digest in referenced or started - stat.st_mtime < GC_GRACE_SECONDS:
+                                total += stat.st_size
+                            else:
+                                os.remove(blob)
+                        except FileNotFoundError:
+                            continue
+                if total <= self.max_bytes or not journals:
+                    return
+                os.remove(journals.pop(0)[1])
+        except OSError:
+            pass
+
+    def _referenced_blobs(self):
+        referenced = set()
+        for name in os.listdir(self.journals_dir):
+            with open(os.path.join(self.journals_dir, name), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    referenced.update(d for d in (entry.get("before"), entry.get("after")) if d)
+        with self._lock:
+            for entry in self.entries:
+                referenced.update(d for d in (entry.get("before"), entry.get("after")) if d)
+        return referenced
+
+
+_store = None
+
+def get_snapshot_store():
+    """Return the snapshot store of this session, or of the current workspace"""
+    global _store
+    workspace = current_workspace()
+    if workspace is not None:
+        if workspace.snapshots is None:
+            workspace.snapshots = SnapshotStore(session_id=f"{SESSION_ID}-{workspace.name}")
+        return workspace.snapshots
+    if _store is None:
+        _store = SnapshotStore()
+    return _store
+
+def snapshot_write(path, content, tool):
+    """Journal the current content of path before it is replaced by `content` (str or None)"""
+    store = get_snapshot_store()
+    before = store.read_current(path)
+    after = content.encode("utf-8") if content is not None else None
+    return store.record(path, before, after, tool)
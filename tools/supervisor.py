@@ -0,0 +1,281 @@
+import os
+import shutil
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+
+from .workspace import current_workspace
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Exited processes kept for `status` after they have been reaped
+FINISHED_HISTORY = 20
+
+# Seconds between resource samples of running processes
+SAMPLE_INTERVAL = 1.0
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_HAS_PROC = os.path.isdir("/proc/self")
+
+
+def default_limits():
+    """Resource limits for spawned processes, from CODEXLITE_RLIMIT_* variables"""
+    limits = {}
+    for key, env, scale in (("cpu", "CODEXLITE_RLIMIT_CPU", 1),
+                            ("as", "CODEXLITE_RLIMIT_AS_MB", 1024 * 1024),
+                            ("nofile", "CODEXLITE_RLIMIT_NOFILE", 1)):
+        value = os.getenv(env)
+        if value:
+            limits[key] = int(value) * scale
+    return limits
+
+# util-linux prlimit sets the limits and then execs the command, so the
+# child never runs Python code between fork and exec (no preexec_fn)
+PRLIMIT = shutil.which("prlimit")
+_PRLIMIT_OPTIONS = {"cpu": "--cpu", "as": "--as", "nofile": "--nofile"}
+
+def _with_limits(cmd, limits, shell):
+    """Run cmd under prlimit; returns the (cmd, shell) to pass to Popen"""
+    if shell:
+        cmd = ["/bin/sh", "-c", cmd] if isinstance(cmd, str) else ["/bin/sh", "-c", *cmd]
+    elif isinstance(cmd, str):
+        cmd = [cmd]
+    options = [f"{_PRLIMIT_OPTIONS[key]}={value}" for key, value in limits.items()]
+    return [PRLIMIT, *options, "--", *cmd], False
+
+def _apply_limits(pid, limits):
+    """Set rlimits on a started process, where prlimit is not installed"""
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    names = {"cpu": resource.RLIMIT_CPU, "as": resource.RLIMIT_AS, "nofile": resource.RLIMIT_NOFILE}
+    for key, value in limits.items():
+        try:
+            resource.prlimit(pid, names[key], (value, value))
+        except (OSError, ValueError):
+            pass    # the process already exited, or the limit is above our own
+
+
+def _read_proc_table():
+    """Map session id -> list of (pid, cpu seconds, rss bytes) from /proc"""
+    sessions = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read().decode(errors="replace")
+        except OSError:
+            continue
+        fields = stat[stat.rindex(")") + 2:].split()
+        session = int(fields[3])
+        cpu = sum(int(v) for v in fields[11:15]) / _CLK_TCK   # utime, stime, cutime, cstime
+        rss = int(fields[21]) * _PAGE_SIZE
+        sessions.setdefault(session, []).append((int(entry), cpu, rss))
+    return sessions
+
+
+class ManagedProcess:
+    """A process started by the supervisor, leading its own session"""
+
+    def __init__(self, process, cmd, kind, limits, workspace=None):
+        self.process = process
+        self.workspace = workspace
+        self.pid = process.pid
+        self.cmd = cmd
+        self.kind = kind
+        self.limits = limits
+        self.started = time.time()
+        self.ended = None
+        self.returncode = None
+        self.cpu_seconds = 0.0
+        self.peak_rss = 0
+
+    @property
+    def running(self):
+        return self.returncode is None
+
+    def record_sample(self, members):
+        # Exited children are folded into their parent's cutime/cstime, so keep the maximum
+        self.cpu_seconds = max(self.cpu_seconds, sum(cpu for _, cpu, _ in members))
+        self.peak_rss = max(self.peak_rss, sum(rss for _, _, rss in members))
+
+
+class Supervisor:
+    """Starts commands and servers in their own sessions and accounts for them.
+
+    Every child leads a new session (and so a new process group), which
+    lets the whole tree be signalled at once. Optional rlimits are applied
+    by a prlimit wrapper before exec, or right after spawn when prlimit is
+    not installed. A monitor thread samples CPU time and resident
+    memory of each session from /proc and reaps children that have exited.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = default_limits() if limits is None else limits
+        self.processes = {}
+        self.finished = deque(maxlen=FINISHED_HISTORY)
+        self._lock = threading.Lock()
+        self._monitor = None
+
+    def spawn(self, cmd, kind="command", limits=None, **popen_kwargs):
+        """Start cmd in a new session and track it; Popen keyword arguments pass through"""
+        limits = self.limits if limits is None else limits
+        label = cmd if isinstance(cmd, str) else " ".join(cmd)
+        if limits and PRLIMIT:
+            cmd, popen_kwargs["shell"] = _with_limits(cmd, limits, popen_kwargs.get("shell", False))
+        process = subprocess.Popen(
+            cmd,
+            start_new_session=True,
+            **popen_kwargs
+        )
+        if limits and not PRLIMIT:
+            _apply_limits(process.pid, limits)
+        managed = ManagedProcess(process, label, kind, limits, current_workspace())
+        with self._lock:
+            self.processes[managed.pid] = managed
+        self._ensure_monitor()
+        return managed
+
+    def _ensure_monitor(self):
+        if self._monitor is None or not self._monitor.is_alive():
+            self._monitor = threading.Thread(target=self._run_monitor, daemon=True)
+            self._monitor.start()
+
+    def _run_monitor(self):
+        while True:
+            self.sample()
+            self.reap()
+            with self._lock:
+                if not self.processes:
+                    self._monitor = None
+                    return
+            time.sleep(SAMPLE_INTERVAL)
+
+    def sample(self):
+        """Update CPU time and peak RSS of running processes"""
+        if not _HAS_PROC:
+            return
+        try:
+            table = _read_proc_table()
+        except OSError:
+            return
+        with self._lock:
+            managed = list(self.processes.values())
+        for proc in managed:
+            members = table.get(proc.pid)
+            if members:
+                proc.record_sample(members)
+
+    def reap(self):
+        """Collect exited children and move them to the finished history"""
+        with self._lock:
+            for pid, proc in list(self.processes.items()):
+                code = proc.process.poll()
+                if code is not None:
+                    proc.returncode = code
+                    proc.ended = time.time()
+                    del self.processes[pid]
+                    self.finished.append(proc)
+
+    def _session_members(self, proc):
+        if not _HAS_PROC:
+            return []
+        try:
+            return [pid for pid, _, _ in _read_proc_table().get(proc.pid, [])]
+        except OSError:
+            return []
+
+    def kill_descendants(self, proc, grace=1.0):
+        """Kill everything in the process's session except the process itself"""
+        members = [pid for pid in self._session_members(proc) if pid != proc.pid]
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            for pid in members:
+                try:
+                    os.kill(pid, sig)
+                except (ProcessLookupError, PermissionError):
+                    pass
+            deadline = time.monotonic() + grace
+            while members and time.monotonic() < deadline:
+                members = [pid for pid in members if os.path.exists(f"/proc/{pid}")]
+                time.sleep(0.05)
+            if not members:
+                break
+        return not members
+
+    def kill_tree(self, proc, grace=5.0):
+        """Terminate the process group, escalating to SIGKILL after `grace` seconds"""
+        self.sample()
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            proc.process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            pass
+        # Grandchildren may outlive the leader or have moved to another group
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        for pid in self._session_members(proc):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        try:
+            proc.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        self.reap()
+
+    def stop(self, kind=None):
+        """Kill the trees of all running processes, optionally of one kind; returns the count"""
+        with self._lock:
+            targets = [p for p in self.processes.values() if kind is None or p.kind == kind]
+        for proc in targets:
+            self.kill_tree(proc)
+        return len(targets)
+
+    def status(self, workspace=None):
+        """Table of running and recently finished processes with their resource use.
+
+        Given a Workspace, only the processes started in it are shown, so
+        sessions sharing the supervisor do not see each other's commands.
+        """
+        self.sample()
+        self.reap()
+        with self._lock:
+            rows = list(self.processes.values()) + list(self.finished)
+        if workspace is not None:
+            rows = [proc for proc in rows if proc.workspace is workspace]
+        if not rows:
+            return "No processes have been started"
+        now = time.time()
+        lines = [f"{'PID':>7}  {'KIND':<8} {'STATE':<10} {'CPU(s)':>7} {'PEAK RSS':>9} {'TIME':>7}  COMMAND"]
+        for proc in rows:
+            state = "running" if proc.running else f"exit {proc.returncode}"
+            elapsed = (proc.ended or now) - proc.started
+            rss = f"{proc.peak_rss / (1024 * 1024):.1f}M" if proc.peak_rss else "n/a"
+            cmd = proc.cmd if len(proc.cmd) <= 60 else proc.cmd[:57] + "..."
+            lines.append(f"{proc.pid:>7}  {proc.kind:<8} {state:<10} {proc.cpu_seconds:>7.2f} {rss:>9} "
+                         f"{elapsed:>6.0f}s  {cmd}")
+        if self.limits:
+            lines.append("Limits: " + ", ".join(f"{k}={v}" for k, v in sorted(self.limits.items())))
+        return "\n".join(lines)
+
+
+_supervisor = None
+
+def get_supervisor():
+    """Return the supervisor shared by the command and server tools"""
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = Supervisor()
+    return _supervisor
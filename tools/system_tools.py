@@ -1,18 +1,23 @@
-import os
 import socket
 
+from .workspace import getcwd
+
 def get_current_directory():
     """Get current working directory"""
-    return f"Current directory: {os.getcwd()}"
+    return f"Current directory: {getcwd()}"
+
+def port_in_use(port, host='localhost'):
+    """Return True when something accepts connections on the port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(1)
+        return s.connect_ex((host, int(port))) == 0
 
 def check_port(port):
     """Check if port is in use"""
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            result = s.connect_ex(('localhost', int(port)))
-            if result == 0:
-                return f"Port {port} is in use"
-            else:
-                return f"Port {port} is available"
+        if port_in_use(port):
+            return f"Port {port} is in use"
+        else:
+            return f"Port {port} is available"
     except Exception as e:
         return f"Error checking port: {e}" 
\ No newline at end of file
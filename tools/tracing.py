@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+from .snapshot_store import CODEXLITE_HOME, SESSION_ID
+
+TRACES_DIR = os.path.join(CODEXLITE_HOME, "traces")
+
+# Write spans to TRACES_DIR/<session>.jsonl; with 0 they are only kept in memory for `stats`
+TRACE_TO_FILE = os.getenv("CODEXLITE_TRACE", "1") != "0"
+
+# Spans kept in memory per session for `stats`
+MAX_SPANS_IN_MEMORY = 20000
+
+# Rows of the stats table: (label, category, span name, attribute)
+STATS_ROWS = [
+    ("LLM step", "llm", "step", "dur"),
+    ("  time to first token", "llm", "step", "ttft"),
+    ("API call", "api", "chat_completion", "dur"),
+    ("Compaction", "context", "compaction", "dur"),
+    ("Compaction wait", "context", "compaction_wait", "dur"),
+]
+
+
+class Tracer:
+    """Records timed spans of one session.
+
+    A span has a name, a category, its start (epoch seconds), duration,
+    thread and attributes such as token counts or output size. Spans are
+    appended to a JSONL trace file as they finish and kept in memory for
+    the `stats` command; `export_chrome` turns a trace into the Chrome
+    trace format for chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, session_id=None, to_file=TRACE_TO_FILE):
+        self.session_id = session_id or SESSION_ID
+        self.path = os.path.join(TRACES_DIR, f"{self.session_id}.jsonl") if to_file else None
+        self.spans = deque(maxlen=MAX_SPANS_IN_MEMORY)
+        self._file = None
+        self._lock = threading.Lock()
+
+    def record(self, name, category, start, duration, **attrs):
+        span = {
+            "name": name,
+            "cat": category,
+            "start": start,
+            "dur": duration,
+            "tid": threading.current_thread().name,
+            **attrs,
+        }
+        with self._lock:
+            self.spans.append(span)
+            if self.path is None:
+                return span
+            try:
+                if self._file is None:
+                    os.makedirs(TRACES_DIR, exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(json.dumps(span, default=str) + "\n")
+                self._file.flush()
+            except OSError:
+                self.path = None    # keep tracing in memory rather than failing the session
+        return span
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_current = contextvars.ContextVar("codexlite_tracer", default=None)
+
+def current_tracer():
+    return _current.get()
+
+@contextmanager
+def use_tracer(tracer):
+    """Record spans of the block (and of threads started with its context) into tracer"""
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def span(name, category, **attrs):
+    """Time the block as a span of the current tracer; yields a dict for more attributes.
+
+    Without a current tracer this only yields the dict. An exception leaving
+    the block is recorded as the span's error and re-raised.
+    """
+    tracer = _current.get()
+    if tracer is None:
+        yield attrs
+        return
+    start = time.time()
+    clock = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs.setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        tracer.record(name, category, start, time.perf_counter() - clock, **attrs)
+
+
+def find_trace(session=None):
+    """Path of a session's trace file, or of the most recent trace; None when there is none"""
+    if session is not None:
+        path = session if os.path.exists(session) else os.path.join(TRACES_DIR, f"{session}.jsonl")
+        return path if os.path.exists(path) else None
+    if not os.path.isdir(TRACES_DIR):
+        return None
+    traces = [os.path.join(TRACES_DIR, name) for name in os.listdir(TRACES_DIR)]
+    return max(traces, key=os.path.getmtime) if traces else None
+
+def load_trace(path):
+    """Spans of a JSONL trace file, skipping a line torn by a crash"""
+    spans = []
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return spans
+
+def export_chrome(spans, path):
+    """Write spans as Chrome trace events ("X" complete events, microseconds)"""
+    threads = {}
+    events = []
+    for s in spans:
+        tid = threads.setdefault(s.get("tid", "main"), len(threads) + 1)
+        args = {k: v for k, v in s.items() if k not in ("name", "cat", "start", "dur", "tid")}
+        events.append({"name": s["name"], "cat": s["cat"], "ph": "X", "pid": 1, "tid": tid,
+                       "ts": int(s["start"] * 1e6), "dur": int(s["dur"] * 1e6), "args": args})
+    for name, tid in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(spans)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def _row(label, values):
+    return (f"{label:<28} {len(values):>6} {_percentile(values, 0.5):>8.2f}s {_percentile(values, 0.9):>8.2f}s "
+            f"{_percentile(values, 0.99):>8.2f}s {max(values):>8.2f}s {sum(values):>9.2f}s")
+
+def stats_table(spans):
+    """Latency percentiles of LLM steps, API calls, tools and compaction, plus token and retry totals"""
+    spans = list(spans)
+    if not spans:
+        return "Stats: no spans recorded yet"
+    lines = [f"{'':<28} {'count':>6} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'total':>10}"]
+    for label, category, name, attribute in STATS_ROWS:
+        values = [s[attribute] for s in spans
+                  if s["cat"] == category and s["name"] == name and s.get(attribute) is not None]
+        if values:
+            lines.append(_row(label, values))
+    tools = sorted({s["name"] for s in spans if s["cat"] == "tool"})
+    for tool in tools:
+        lines.append(_row(f"Tool {tool}", [s["dur"] for s in spans if s["cat"] == "tool" and s["name"] == tool]))
+
+    steps = [s for s in spans if s["cat"] == "llm" and s["name"] == "step"]
+    calls = [s for s in spans if s["cat"] == "api"]
+    tool_spans = [s for s in spans if s["cat"] == "tool"]
+    summary = []
+    if steps:
+        prompt = [s.get("prompt_tokens", 0) for s in steps]
+        summary.append(f"Prompt tokens: {prompt[0]} → {prompt[-1]} (max {max(prompt)})")
+        summary.append(f"Completion tokens: {sum(s.get('completion_tokens', 0) for s in steps)}")
+        failed = sum(1 for s in steps if not s.get("ok", True))
+        if failed:
+            summary.append(f"Failed steps: {failed}")
+    if calls:
+        retries = sum(s.get("retries", 0) for s in calls)
+        backoff = sum(s.get("backoff", 0) for s in calls)
+        summary.append(f"Retries: {retries} (backoff {backoff:.1f}s)")
+    if tool_spans:
+        summary.append(f"Tool output: {sum(s.get('output_bytes', 0) for s in tool_spans)} bytes")
+    return "\n".join(lines + [" | ".join(summary)] if summary else lines)
+
@@ -0,0 +1,77 @@
+import contextvars
+import os
+import shutil
+from contextlib import contextmanager
+
+
+class Workspace:
+    """Working directory and tool state of one agent session.
+
+    Interactive sessions use the process working directory and the shared
+    shell, snapshot store, server list and tool threads. Headless tasks and
+    server sessions that run side by side each get a Workspace instead, so
+    their relative paths, shell, undo history, servers and tool threads
+    stay apart without touching os.chdir.
+    """
+
+    def __init__(self, root, name=None):
+        self.root = os.path.abspath(root)
+        self.cwd = self.root
+        self.name = name or os.path.basename(self.cwd)
+        self.shell = None
+        self.snapshots = None
+        self.servers = []
+        self.pool = None
+        self.log_dir = None
+
+    def close(self):
+        """Stop this workspace's servers, shell and tool threads, drop its file indexes and delete its logs"""
+        from .command_tools import stop_servers
+        from .code_search import drop_search_indexes
+        from .workspace_index import drop_indexes
+        with use_workspace(self):
+            stop_servers()
+        drop_search_indexes(self.root)
+        drop_indexes(self.root)
+        if self.shell is not None:
+            self.shell.close()
+            self.shell = None
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        if self.log_dir is not None:
+            shutil.rmtree(self.log_dir, ignore_errors=True)
+            self.log_dir = None
+
+
+_current = contextvars.ContextVar("codexlite_workspace", default=None)
+
+def current_workspace():
+    """The Workspace of the running task, or None in the interactive session"""
+    return _current.get()
+
+@contextmanager
+def use_workspace(workspace):
+    """Run tools in the block (and in threads started with its context) against workspace"""
+    token = _current.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current.reset(token)
+
+def getcwd():
+    """The directory relative tool paths are resolved against"""
+    workspace = _current.get()
+    return workspace.cwd if workspace is not None else os.getcwd()
+
+def chdir(path):
+    """Change the working directory of the current workspace"""
+    workspace = _current.get()
+    if workspace is None:
+        os.chdir(path)
+    else:
+        workspace.cwd = os.path.abspath(path)
+
+def resolve(path):
+    """Absolute form of a tool path, relative to the current workspace"""
+    return os.path.normpath(os.path.join(getcwd(), os.path.expanduser(str(path))))
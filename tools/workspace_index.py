@@ -0,0 +1,211 @@
+import os
+import re
+import threading
+
+from .workspace import getcwd, resolve
+
+# Directories never worth indexing, whatever .gitignore says
+DEFAULT_IGNORES = {
+    ".git", ".hg", ".svn", "node_modules", "venv", ".venv", "env", "__pycache__",
+    "dist", "build", ".next", ".nuxt", ".cache", ".parcel-cache", "coverage",
+    ".mypy_cache", ".pytest_cache", ".tox", ".idea", ".vscode", ".DS_Store",
+}
+
+
+def _translate(pattern):
+    """Translate a glob (with ** spanning directories) into a regex body"""
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+def glob_regex(pattern):
+    """Compile a glob pattern matched against a whole relative posix path"""
+    return re.compile(f"^{_translate(pattern)}$")
+
+
+class IgnoreRule:
+    """One .gitignore line, relative to the directory holding the file"""
+
+    def __init__(self, base, line):
+        self.base = base
+        self.negate = line.startswith("!")
+        pattern = line[1:] if self.negate else line
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        self.anchored = "/" in pattern
+        self.regex = glob_regex(pattern.lstrip("/"))
+
+    def matches(self, rel, name, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel.startswith(self.base + "/"):
+                return False
+            rel = rel[len(self.base) + 1:]
+        return bool(self.regex.match(rel if self.anchored else name))
+
+def _load_gitignore(base, path):
+    rules = []
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.rstrip("\n").rstrip()
+                if line and not line.startswith("#"):
+                    rules.append(IgnoreRule(base, line))
+    except OSError:
+        pass
+    return rules
+
+
+class _Dir:
+    __slots__ = ("mtime", "signature", "files", "subdirs")
+
+    def __init__(self, mtime, signature, files, subdirs):
+        self.mtime = mtime
+        self.signature = signature
+        self.files = files
+        self.subdirs = subdirs
+
+
+class WorkspaceIndex:
+    """In-memory index of the files under a directory.
+
+    Directories are listed with os.scandir, skipping DEFAULT_IGNORES and
+    anything matched by .gitignore files at or below the root. A refresh
+    stats every indexed directory but lists again only those whose mtime,
+    or the .gitignore files governing them, changed since the last refresh.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.dirs = {}
+        self._lock = threading.Lock()
+
+    def is_ignored(self, rel, name, is_dir, rules):
+        if name in DEFAULT_IGNORES:
+            return True
+        ignored = False
+        for rule in rules:
+            if rule.matches(rel, name, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+    def refresh(self):
+        with self._lock:
+            seen = set()
+            self._refresh_dir("", [], (), seen)
+            for rel in set(self.dirs) - seen:
+                del self.dirs[rel]
+
+    def _refresh_dir(self, rel, rules, signature, seen):
+        path = os.path.join(self.root, rel) if rel else self.root
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        seen.add(rel)
+
+        gitignore = os.path.join(path, ".gitignore")
+        try:
+            signature += ((rel, os.stat(gitignore).st_mtime_ns),)
+            rules = rules + _load_gitignore(rel, gitignore)
+        except OSError:
+            pass
+
+        entry = self.dirs.get(rel)
+        if entry is None or entry.mtime != mtime or entry.signature != signature:
+            files, subdirs = [], []
+            try:
+                with os.scandir(path) as it:
+                    for item in it:
+                        child = f"{rel}/{item.name}" if rel else item.name
+                        try:
+                            is_dir = item.is_dir(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        if self.is_ignored(child, item.name, is_dir, rules):
+                            continue
+                        (subdirs if is_dir else files).append(item.name)
+            except OSError:
+                return
+            entry = _Dir(mtime, signature, sorted(files), sorted(subdirs))
+            self.dirs[rel] = entry
+
+        for name in entry.subdirs:
+            self._refresh_dir(f"{rel}/{name}" if rel else name, rules, signature, seen)
+
+    def files(self):
+        """Relative posix paths of every indexed file"""
+        for rel, entry in self.dirs.items():
+            prefix = f"{rel}/" if rel else ""
+            for name in entry.files:
+                yield prefix + name
+
+    def glob(self, pattern):
+        """Sorted indexed paths matching a glob pattern relative to the root"""
+        self.refresh()
+        pattern = pattern.replace(os.sep, "/")
+        while pattern.startswith("./"):
+            pattern = pattern[2:]
+        regex = glob_regex(pattern)
+        with self._lock:
+            return sorted(p for p in self.files() if regex.match(p))
+
+    def listing(self, rel):
+        """(files, subdirs) of an indexed directory, or None if it is ignored or missing"""
+        self.refresh()
+        with self._lock:
+            entry = self.dirs.get(rel)
+            return None if entry is None else (list(entry.files), list(entry.subdirs))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(root="."):
+    """Return the index of a directory, creating it on first use"""
+    root = resolve(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = WorkspaceIndex(root)
+    return index
+
+def drop_indexes(root):
+    """Forget the indexes of root and of directories under it"""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        for key in [k for k in _indexes if k == root or k.startswith(root.rstrip(os.sep) + os.sep)]:
+            del _indexes[key]
+
+def locate(path="."):
+    """Return (index, relative path) for a path, indexing from the working directory when it contains it"""
+    target = resolve(path)
+    cwd = getcwd()
+    if target == cwd or target.startswith(cwd.rstrip(os.sep) + os.sep):
+        rel = os.path.relpath(target, cwd)
+        return get_index(cwd), "" if rel == "." else rel.replace(os.sep, "/")
+    return get_index(target), ""